@@ -6,26 +6,50 @@ Freelancehunt → Telegram Bot
   /pause          — пауза
   /menu           — головне меню
   /status         — стан бота
-  /stats          — статистика за сьогодні
+  /stats          — статистика за сьогодні і тренди за тиждень
   /keywords       — список ключових слів
-  /addkw слово    — додати ключове слово
+  /addkw вираз    — додати ключове слово або вираз (AND, OR, NOT, "фраза", префікс*)
   /delkw слово    — видалити ключове слово
   /clearkw        — очистити всі ключові слова
   /search слово   — разовий пошук (без збереження)
   /budget 1000    — мінімальний бюджет (0 = скинути)
+  /rating 50      — мін. рейтинг замовника
+  /reviews 3      — мін. кількість відгуків замовника
+  /accountage 30  — мін. вік акаунта замовника (днів)
   /bookmarks      — збережені проекти
   /blacklist      — чорний список замовників
   /digest HH:MM   — щоденний дайджест
   /profile        — мій акаунт і баланс
+  /perf check 3   — профілювати наступні N циклів (або handlers N, off)
+  /traces         — p50/p99 затримки від публікації до доставки
   /help           — допомога
 """
 
 import os
+import re
+import html
+import json
+import math
 import time
+import codecs
+import pstats
+import random
+import cProfile
+import tracemalloc
+import heapq
+import hashlib
+import sqlite3
 import logging
 import threading
-from datetime import date, datetime
-from collections import defaultdict
+import multiprocessing
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from io import StringIO
+from array import array
+from dataclasses import dataclass, field
+from itertools import combinations
+from collections import defaultdict, OrderedDict, deque, Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, TimeoutError as FutureTimeout
 
 import requests
 from dotenv import load_dotenv
@@ -37,7 +61,40 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID   = os.getenv("TELEGRAM_CHAT_ID")
 FH_TOKEN           = os.getenv("FREELANCEHUNT_TOKEN")
 CHECK_INTERVAL     = int(os.getenv("CHECK_INTERVAL_SECONDS", 300))
-SKILL_IDS          = os.getenv("SKILL_IDS", "")
+SKILL_IDS          = os.getenv("SKILL_IDS", "")  # "1,2,3" або "my" — мої навички з профілю
+PAGE_MIN           = int(os.getenv("PROJECTS_PAGE_MIN", 10))
+PAGE_MAX           = int(os.getenv("PROJECTS_PAGE_MAX", 50))
+STARTUP_DEADLINE   = int(os.getenv("STARTUP_DEADLINE_SECONDS", 30))
+MESSAGE_WORKERS    = int(os.getenv("MESSAGE_FETCH_WORKERS", 4))
+THREAD_COALESCE    = int(os.getenv("THREAD_COALESCE_SECONDS", 600))
+EMPLOYER_TTL       = int(os.getenv("EMPLOYER_CACHE_TTL_SECONDS", 6 * 3600))
+EMPLOYER_CACHE_MAX = int(os.getenv("EMPLOYER_CACHE_SIZE", 1000))
+EMPLOYER_WORKERS   = int(os.getenv("EMPLOYER_FETCH_WORKERS", 4))
+WATCH_INTERVAL     = int(os.getenv("WATCH_INTERVAL_SECONDS", 1800))
+WATCH_BATCH        = int(os.getenv("WATCH_BATCH", 20))
+BREAKER_FAILURES   = int(os.getenv("BREAKER_FAILURES", 3))
+BREAKER_BASE       = float(os.getenv("BREAKER_BASE_SECONDS", 30))
+BREAKER_MAX        = float(os.getenv("BREAKER_MAX_SECONDS", 900))
+RATE_WINDOW        = int(os.getenv("FH_RATE_WINDOW_SECONDS", 3600))
+RATE_RESERVE       = int(os.getenv("FH_RATE_RESERVE", 10))
+RATE_BURST         = int(os.getenv("FH_RATE_BURST", 10))
+OUTBOX_PATH        = os.getenv("OUTBOX_PATH", "outbox.db")
+OUTBOX_ATTEMPTS    = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+LANE_MAX_WAIT      = float(os.getenv("OUTBOX_LANE_MAX_WAIT_SECONDS", 120))
+LANE_BURST         = int(os.getenv("OUTBOX_LANE_BURST", 10))
+DUP_DISTANCE       = int(os.getenv("DUPLICATE_MAX_DISTANCE", 6))
+DUP_RETENTION      = int(os.getenv("DUPLICATE_RETENTION_DAYS", 14)) * 86400
+DUP_MODE           = os.getenv("DUPLICATE_MODE", "collapse")  # collapse | suppress
+MIN_SCORE          = float(os.getenv("MIN_RELEVANCE_SCORE", 0))
+SCORE_BUDGET_CAP   = float(os.getenv("SCORE_BUDGET_CAP", 50000))
+STATS_DAYS         = int(os.getenv("STATS_RETENTION_DAYS", 28))
+WORKERS            = int(os.getenv("WORKERS", 0))  # 0 — все в одному процесі
+WORKER_TIMEOUT     = float(os.getenv("WORKER_TIMEOUT_SECONDS", 60))
+DIGEST_TOP         = int(os.getenv("DIGEST_TOP", 10))
+PROFILE_CYCLES     = int(os.getenv("PROFILE_CYCLES", 0))
+PROFILE_DIR        = os.getenv("PROFILE_DIR", "profiles")
+TRACE_PATH         = os.getenv("TRACE_PATH", "traces.jsonl")  # порожньо — вимкнено
+TRACE_MAX_BYTES    = int(os.getenv("TRACE_MAX_BYTES", 5 * 1024 * 1024))
 # ──────────────────────────────────────────────────────────────────────────────
 
 logging.basicConfig(
@@ -50,13 +107,21 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
-FH_BASE    = "https://api.freelancehunt.com/v2"
+# Базові URL можна перевизначити — напр. на локальні заглушки для тестів
+FH_BASE    = os.getenv("FH_API_URL") or "https://api.freelancehunt.com/v2"
+TG_BASE    = os.getenv("TG_API_URL") or "https://api.telegram.org"
 FH_HEADERS = {"Authorization": f"Bearer {FH_TOKEN}", "Accept-Language": "uk"}
+FH_TIMEOUT             = 15
+FH_INTERACTIVE_TIMEOUT = 5  # команди користувача не повинні висіти довго
 
 # ─── Стан ─────────────────────────────────────────────────────────────────────
 state = {
     "paused":      False,
     "min_budget":  0,
+    # Фільтри репутації замовника (0 = вимкнено)
+    "min_rating":       0,
+    "min_reviews":      0,
+    "min_account_days": 0,
     "digest_time": "",
     "digest_sent": "",
 }
@@ -73,31 +138,126 @@ seen_feed_ids:    set = set()
 # {str(pid): {id, name, url, budget, employer, saved_at}}
 bookmarks: dict = {}
 
+# Відстеження закладок: {str(pid): {etag, modified, fields, checked_at}}
+# fields — останній відомий стан (статус, бюджет, виконавець); None — ще не знятий
+watched: dict = {}
+watch_stats: dict = {"requests": 0, "not_modified": 0, "changes": 0}
+
 # {login}
 blacklist: set = set()
 
+# Кеш профілів замовників: {login: {id, rating, reviews, registered_at, fetched_at}}
+# Порядок — від найдавніше використаних, вони й витісняються першими
+employer_cache: OrderedDict = OrderedDict()
+employer_cache_stats = {"hits": 0, "misses": 0, "refreshed": 0, "evicted": 0}
+employer_lock = threading.Lock()
+
+# Circuit breaker для кожного ендпоінта API:
+# {endpoint: {state: closed|open|half_open, failures, opens, retry_at}}
+breakers: dict = {}
+breaker_lock = threading.Lock()
+
+# Бюджет запитів до API за заголовками X-Ratelimit-*:
+# фонові опитування розподіляються по вікну, RATE_RESERVE лишається командам.
+# remaining — локальний відлік (зменшується ще до відповіді), reported — найменше,
+# що повідомив сервер у поточному вікні
+rate_budget = {"limit": None, "remaining": None, "reported": None, "reset_at": 0.0, "tat": 0.0, "waited": 0.0}
+rate_lock = threading.Lock()
+
+# SimHash-індекс проектів для пошуку перепублікацій.
+# 64-бітний відбиток ділиться на DUP_DISTANCE + 2 блоки: якщо відстань Хемінга
+# не більша за DUP_DISTANCE, хоча б два блоки збігаються точно. Таблиця на
+# кожну пару блоків (28 при DUP_DISTANCE=6) з ключем у 16 біт: кошики майже
+# завжди з 0–1 проекту, тож пошук не росте з історією (з однією смугою
+# на 9 біт кошик містив ~n/512 проектів і пошук був лінійним). Ціна — близько
+# 3 КБ пам'яті на проект у вікні DUPLICATE_RETENTION_DAYS.
+SIMHASH_BLOCKS = DUP_DISTANCE + 2
+SIMHASH_MASKS  = [
+    sum(1 << bit for b in pair
+        for bit in range(64 * b // SIMHASH_BLOCKS, 64 * (b + 1) // SIMHASH_BLOCKS))
+    for pair in combinations(range(SIMHASH_BLOCKS), 2)
+]
+# Кошики — кортежі, а не множини: таблиць багато, а кошик майже завжди з одного pid
+simhash_buckets = [{} for _ in SIMHASH_MASKS]  # таблиця -> {ключ: (pid, ...)}
+simhash_prints: dict = {}     # pid -> відбиток
+simhash_order:  deque = deque()  # (added_at, pid) — для вікна зберігання
+simhash_lock = threading.Lock()
+
 # Відстеження листування: {thread_id: last_message_at}
-# Зберігаємо час останнього повідомлення в кожному треді
+# Зберігаємо час останнього повідомлення в кожному треді — це ж і курсор,
+# від якого довантажуються нові повідомлення треду
 thread_last_msg: dict = {}
 
+# Живі сповіщення тредів: {thread_id: {key, opened_at, messages}}.
+# Поки вікно THREAD_COALESCE не минуло, нові повідомлення треду редагують
+# сповіщення key на місці, а не надсилають ще одне
+thread_live: dict = {}
+
 # [{remind_at, pid, name, url}]
 reminders: list = []
 
-stats: dict = defaultdict(lambda: {"projects": 0, "messages": 0, "feed": 0})
+# Погодинна статистика: кільце фіксованого розміру на STATS_DAYS діб.
+# Для кожної метрики — масив лічильників, слот = година % розмір;
+# stats_hours тримає, якій годині зараз належить слот (застарілий — обнуляється).
+# send_ms — сума затримок доставки (мс), sent — кількість доставок,
+# edits — оновлень уже надісланих сповіщень замість нових.
+STAT_METRICS = ("projects", "messages", "feed", "rejected", "send_ms", "sent", "edits")
+STATS_SLOTS  = STATS_DAYS * 24
+stats       = {m: array("Q", bytes(8 * STATS_SLOTS)) for m in STAT_METRICS}
+stats_hours = array("q", [-1]) * STATS_SLOTS
+stats_lock  = threading.Lock()
+
+# Найкращі проекти з останнього дайджесту: мін-купа з DIGEST_TOP записів
+# (score, id, name, budget, url), на вершині — найслабший, тож новий кандидат або
+# витісняє його, або відкидається. Пам'ять стала, дайджест рендериться з купи без
+# звернень до API; після відправки купа починається з нуля.
+digest_top: dict = {"heap": [], "ids": set()}
+digest_lock = threading.Lock()
 
 waiting_for: dict = {}  # chat_id -> режим
 
+# Гейт готовності: відкривається, коли знято базовий стан (або вийшов дедлайн старту)
+ready = threading.Event()
+startup: dict = {"started_at": 0.0, "ready_in": None, "missing": []}
+
+# Команди, яким потрібен базовий стан — до готовності відкладаються
+BASELINE_COMMANDS = {"/stats"}
+deferred: list = []  # [(text, chat_id)]
+deferred_lock = threading.Lock()
+
 
 def today() -> str:
     return date.today().isoformat()
 
 
+def day_start_hour(days_ago: int = 0) -> int:
+    """Номер години (від epoch) початку локальної доби days_ago днів тому."""
+    day = date.today() - timedelta(days=days_ago)
+    return int(datetime.combine(day, datetime.min.time()).timestamp() // 3600)
+
+
+def parse_ts(value) -> float:
+    """ISO-час з API → unix timestamp (0 якщо не розпізнано)."""
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
 def now_hhmm() -> str:
     return datetime.now().strftime("%H:%M")
 
 
 # ─── Утиліти для URL ──────────────────────────────────────────────────────────
 
+# Роздільники, що в slug стають дефісом; сусідні (і вже наявні дефіси) — одним
+SLUG_SEPARATORS = re.compile(r"[ /\\:?#\[\]@!$&'()*+,;=-]+")
+
+
+def slugify(name: str) -> str:
+    return SLUG_SEPARATORS.sub("-", name.lower()).strip("-")[:60]
+
+
 def build_project_url(item: dict) -> str:
     """
     Правильний URL проекту.
@@ -109,9 +269,9 @@ def build_project_url(item: dict) -> str:
     links = item.get("links") or {}
     self_link = links.get("self") or {}
 
-    # links.self може бути dict {"href": "..."} або рядком
+    # links.self може бути dict {"web": "...", "api": "..."} / {"href": "..."} або рядком
     if isinstance(self_link, dict):
-        href = self_link.get("href", "")
+        href = self_link.get("web") or self_link.get("href", "")
     else:
         href = str(self_link)
 
@@ -128,18 +288,8 @@ def build_project_url(item: dict) -> str:
         return href
 
     # Запасний варіант: правильний формат через slugified назву
-    pid  = item.get("id", "")
-    name = attr.get("name", "project")
-    # Генеруємо slug з назви (спрощено)
-    slug = name.lower()
-    for ch in ' /\\:?#[]@!$&\'()*+,;=':
-        slug = slug.replace(ch, "-")
-    # Прибираємо подвійні дефіси
-    while "--" in slug:
-        slug = slug.replace("--", "-")
-    slug = slug.strip("-")[:60]
-
-    return f"https://freelancehunt.com/project/{slug}/{pid}.html"
+    pid = item.get("id", "")
+    return f"https://freelancehunt.com/project/{slugify(attr.get('name', 'project'))}/{pid}.html"
 
 
 def build_employer_url(login: str) -> str:
@@ -150,110 +300,1292 @@ def build_freelancer_url(login: str) -> str:
     return f"https://freelancehunt.com/freelancer/{login}.html"
 
 
+# ─── Трасування ───────────────────────────────────────────────────────────────
+# Кожне сповіщення має trace ID — той самий, що й ключ в outbox
+# (project:123, thread:45:<cursor>, feed:67). Етапи (fetch, filter, rank,
+# format, enqueue, deliver) пишуться рядками JSON у TRACE_PATH — дописуванням,
+# тож так само працює і з воркер-процесів. /traces рахує p50/p99.
+
+trace_lock = threading.Lock()
+
+
+def span(trace_id: str, stage: str, start: float, end: float = None, **extra) -> dict:
+    end = time.time() if end is None else end
+    return {"trace": trace_id, "stage": stage, "start": round(start, 3),
+            "ms": round((end - start) * 1000, 1), **extra}
+
+
+def trace_write(spans: list):
+    if not TRACE_PATH or not spans:
+        return
+    lines = "".join(json.dumps(s, ensure_ascii=False) + "\n" for s in spans)
+    try:
+        with trace_lock:
+            if os.path.exists(TRACE_PATH) and os.path.getsize(TRACE_PATH) > TRACE_MAX_BYTES:
+                os.replace(TRACE_PATH, TRACE_PATH + ".1")
+            with open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(lines)
+    except OSError as e:
+        log.error("Trace write error: %s", e)
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def trace_summary() -> str:
+    """p50/p99 від публікації до доставки і по кожному етапу."""
+    traces = defaultdict(dict)
+    for path in (TRACE_PATH + ".1", TRACE_PATH):
+        if not TRACE_PATH or not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                traces[rec["trace"]][rec["stage"]] = rec
+
+    e2e, detect, stages = [], [], defaultdict(list)
+    for spans in traces.values():
+        for stage, rec in spans.items():
+            stages[stage].append(rec["ms"])
+        deliver = spans.get("deliver")
+        fetch   = spans.get("fetch")
+        if not deliver or deliver.get("status") != 200:
+            continue
+        delivered_at = deliver["start"] + deliver["ms"] / 1000
+        if fetch and fetch.get("published_at"):
+            e2e.append(delivered_at - fetch["published_at"])
+        if fetch:
+            detect.append(delivered_at - fetch["start"])
+        if "queued_ms" in deliver:
+            stages["queue"].append(deliver["queued_ms"])
+
+    if not e2e and not detect:
+        return "Поки немає доставлених сповіщень з трасами."
+    lines = []
+    if e2e:
+        lines.append(f"Публікація → доставка: p50 {percentile(e2e, .5):.0f} с, "
+                     f"p99 {percentile(e2e, .99):.0f} с (n={len(e2e)})")
+    if detect:
+        lines.append(f"Виявлення → доставка: p50 {percentile(detect, .5):.1f} с, "
+                     f"p99 {percentile(detect, .99):.1f} с")
+    lines.append("")
+    for stage in ("fetch", "filter", "rank", "format", "enqueue", "queue", "deliver", "edit"):
+        if stages.get(stage):
+            lines.append(f"{stage}: p50 {percentile(stages[stage], .5):.1f} мс, "
+                         f"p99 {percentile(stages[stage], .99):.1f} мс")
+    return "\n".join(lines)
+
+
+# ─── Проекти ──────────────────────────────────────────────────────────────────
+
+@dataclass(slots=True)
+class Project:
+    """Стислий запис проекту: тільки поля, які бот реально використовує."""
+    id:               int
+    name:             str
+    description:      str
+    budget_amount:    float
+    budget_currency:  str
+    safe:             bool
+    skills:           tuple
+    employer_id:      int
+    employer_login:   str
+    employer_rating:  float
+    employer_reviews: int
+    url:              str
+    published_at:     float
+    duplicate_of:     int = None
+    score:            float = 0.0
+    # Індекс слів тексту (див. doc_index) — будується один раз на проект
+    index:            dict = field(default=None, repr=False, compare=False)
+
+
+def project_from_api(item: dict) -> Project:
+    attr     = item.get("attributes") or {}
+    budget   = attr.get("budget") or {}
+    employer = attr.get("employer") or {}
+    return Project(
+        id               = item.get("id"),
+        name             = attr.get("name") or "Без назви",
+        description      = (attr.get("description") or "").strip(),
+        budget_amount    = budget.get("amount") or 0,
+        budget_currency  = budget.get("currency") or "UAH",
+        safe             = bool(attr.get("is_safe")),
+        skills           = tuple(s.get("name", "") for s in attr.get("skills") or []),
+        employer_id      = employer.get("id"),
+        employer_login   = employer.get("login") or "",
+        employer_rating  = employer.get("rating") or 0,
+        employer_reviews = employer.get("reviews_count") or 0,
+        url              = build_project_url(item),
+        published_at     = parse_ts(attr.get("published_at")),
+    )
+
+
+NUMBER_CHARS = "0123456789+-.eE"
+
+
+def iter_json_items(chunks, key: str = "data"):
+    """
+    Потоково розбирає відповідь виду {"data": [...], ...} з ітератора байтових
+    чанків і віддає елементи масиву key по одному — без декодування всієї
+    відповіді в одне дерево об'єктів.
+    """
+    decoder = json.JSONDecoder()
+    utf8    = codecs.getincrementaldecoder("utf-8")()
+    chunks  = iter(chunks)
+    buf, pos, eof = "", 0, False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            if eof:
+                raise ValueError("JSON обірвався")
+            eof = True
+            chunk = b""
+        buf, pos = buf[pos:] + utf8.decode(chunk, final=eof), 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            more()
+
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                more()
+                continue
+            # Число могло обрізатись на межі чанка («1.» + «5», «4.5e» + «3»):
+            # поки за ним у буфері лише символи, що можуть його продовжити, — дочитуємо
+            if not eof and isinstance(obj, (int, float)) and not buf[end:].strip(NUMBER_CHARS):
+                more()
+                continue
+            pos = end
+            return obj
+
+    def expect(ch):
+        nonlocal pos
+        if peek() != ch:
+            raise ValueError(f"очікувалось {ch!r}")
+        pos += 1
+
+    expect("{")
+    while peek() != "}":
+        if peek() == ",":
+            pos += 1
+            continue
+        name = value()
+        expect(":")
+        if name != key or peek() != "[":
+            value()
+            continue
+        pos += 1
+        while peek() != "]":
+            if peek() == ",":
+                pos += 1
+                continue
+            yield value()
+        pos += 1
+
+
 # ─── Freelancehunt API ────────────────────────────────────────────────────────
 
-def fh_get(path, params=None):
+def endpoint_key(path: str) -> str:
+    """/my/threads/123 -> /my/threads/{id}: один breaker на тип запиту."""
+    return re.sub(r"/\d+", "/{id}", path)
+
+
+def breaker_allow(key: str) -> bool:
+    """
+    closed — пропускаємо все; open — відмовляємо до retry_at;
+    після retry_at пропускаємо рівно один пробний запит (half_open).
+    """
+    with breaker_lock:
+        br = breakers.get(key)
+        if not br or br["state"] == "closed":
+            return True
+        if br["state"] == "open" and time.time() >= br["retry_at"]:
+            br["state"] = "half_open"
+            return True
+        return False
+
+
+def breaker_record(key: str, ok: bool, retry_after: float = 0):
+    with breaker_lock:
+        br = breakers.setdefault(key, {"state": "closed", "failures": 0, "opens": 0, "retry_at": 0.0})
+        if ok:
+            if br["state"] != "closed":
+                log.info("FH %s: breaker закрито", key)
+            br.update(state="closed", failures=0, opens=0, retry_at=0.0)
+            return
+        br["failures"] += 1
+        if br["state"] == "half_open" or br["failures"] >= BREAKER_FAILURES:
+            # Експоненційна пауза з джитером, щоб не бити в API синхронно
+            br["opens"] += 1
+            delay = min(BREAKER_MAX, BREAKER_BASE * 2 ** (br["opens"] - 1))
+            delay = max(retry_after, delay * random.uniform(0.5, 1.0))
+            br.update(state="open", retry_at=time.time() + delay)
+            log.warning("FH %s: breaker відкрито на %.0f с (%d збоїв)", key, delay, br["failures"])
+
+
+def fh_unavailable(path: str) -> int:
+    """Скільки секунд ще чекати до наступної спроби (0 — можна запитувати)."""
+    br = breakers.get(endpoint_key(path))
+    if not br or br["state"] == "closed":
+        return 0
+    if br["state"] == "half_open":
+        return 1
+    return max(0, math.ceil(br["retry_at"] - time.time()))
+
+
+def breaker_summary() -> str:
+    bad = [(k, b) for k, b in sorted(breakers.items()) if b["state"] != "closed"]
+    if not bad:
+        return "в нормі"
+    return "; ".join(
+        f"{k} — {'пробний запит' if b['state'] == 'half_open' else f'пауза {fh_unavailable(k)} с'}"
+        f" ({b['failures']} збоїв)"
+        for k, b in bad
+    )
+
+
+def header_int(headers, name):
     try:
-        r = requests.get(f"{FH_BASE}{path}", headers=FH_HEADERS, params=params, timeout=15)
-        if r.status_code == 200:
-            return r.json()
-        log.warning("FH %s -> %d: %s", path, r.status_code, r.text[:200])
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+def update_rate_budget(headers, status: int):
+    """Оновлює залишок квоти з заголовків відповіді."""
+    limit     = header_int(headers, "X-Ratelimit-Limit")
+    remaining = header_int(headers, "X-Ratelimit-Remaining")
+    reset     = header_int(headers, "X-Ratelimit-Reset")
+    retry     = header_int(headers, "Retry-After")
+    now = time.time()
+    with rate_lock:
+        rb = rate_budget
+        if status == 429:
+            rb["remaining"] = rb["reported"] = 0
+            rb["reset_at"]  = now + (retry or RATE_WINDOW)
+            return
+        if remaining is None:
+            return
+        limit = limit or rb["limit"]
+        # Паралельні запити (треди, замовники, стеження) повертаються не по черзі,
+        # тож залишок може трохи зрости і без скидання. Нове вікно — лише коли
+        # він повернувся майже до ліміту: ближче, ніж запитів буває в польоті
+        inflight   = EMPLOYER_WORKERS + MESSAGE_WORKERS + len(BASELINES)
+        new_window = (rb["reported"] is not None and remaining > rb["reported"]
+                      and (not limit or remaining >= limit - inflight))
+        if reset is not None:
+            # Буває і unix-часом, і кількістю секунд до скидання
+            rb["reset_at"] = reset if reset > 1e9 else now + reset
+        elif rb["reset_at"] <= now or new_window:
+            # Скидання не повідомили — вважаємо, що вікно почалось щойно
+            rb["reset_at"] = now + RATE_WINDOW
+            new_window = True
+        if new_window or rb["reported"] is None:
+            rb["reported"] = remaining
+        else:
+            rb["reported"] = min(rb["reported"], remaining)
+        rb["limit"], rb["remaining"] = limit, remaining
+
+
+def rate_acquire(interactive: bool):
+    """
+    Інтерактивні запити йдуть одразу (для них тримається резерв квоти).
+    Фонові — рівномірно по решті вікна (GCRA з допуском RATE_BURST запитів),
+    а коли лишився тільки резерв — чекають на скидання квоти.
+    """
+    with rate_lock:
+        rb  = rate_budget
+        now = time.time()
+        if rb["remaining"] is None or rb["reset_at"] <= now:
+            return
+        rb["remaining"] = max(0, rb["remaining"] - 1)
+        if interactive:
+            return
+        usable = rb["remaining"] - RATE_RESERVE
+        if usable <= 0:
+            delay = rb["reset_at"] - now
+        else:
+            spacing   = (rb["reset_at"] - now) / usable
+            tat       = max(rb["tat"], now)
+            delay     = max(0.0, tat - now - RATE_BURST * spacing)
+            rb["tat"] = tat + spacing
+        rb["waited"] += delay
+    if delay > 0:
+        log.info("FH: квота майже вичерпана, фоновий запит чекає %.1f с", delay)
+        time.sleep(delay)
+
+
+def rate_summary() -> str:
+    rb = rate_budget
+    if rb["remaining"] is None:
+        return "невідомо"
+    reset_in = max(0, rb["reset_at"] - time.time())
+    return (f"{rb['remaining']}/{rb['limit'] or '?'}, скидання через {reset_in / 60:.0f} хв, "
+            f"фонові запити чекали {rb['waited']:.0f} с")
+
+
+def fh_request(path, params=None, interactive=False, stream=False, validators=None):
+    """
+    GET до Freelancehunt. Повертає відповідь 200 або None — якщо запит не вдався
+    чи breaker ендпоінта відкритий (тоді без мережевого запиту). interactive —
+    коротший таймаут і пріоритет у квоті запитів для команд користувача.
+    validators — {"etag", "modified"} з попередньої відповіді: запит стає
+    умовним, і відповідь 304 (нічого не змінилось) теж повертається.
+    """
+    key = endpoint_key(path)
+    if not breaker_allow(key):
+        log.debug("FH %s: breaker відкрито, пропускаємо", key)
+        return None
+    headers = FH_HEADERS
+    if validators:
+        headers = dict(FH_HEADERS)
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("modified"):
+            headers["If-Modified-Since"] = validators["modified"]
+    rate_acquire(interactive)
+    try:
+        r = requests.get(f"{FH_BASE}{path}", headers=headers, params=params, stream=stream,
+                         timeout=FH_INTERACTIVE_TIMEOUT if interactive else FH_TIMEOUT)
     except Exception as e:
         log.error("FH error: %s", e)
+        breaker_record(key, False)
+        return None
+    update_rate_budget(r.headers, r.status_code)
+    # 5xx і 429 — API недоступне; решта 4xx — проблема запиту, а не сервісу
+    if r.status_code >= 500 or r.status_code == 429:
+        try:
+            retry_after = float(r.headers.get("Retry-After") or 0)
+        except ValueError:
+            retry_after = 0
+        breaker_record(key, False, retry_after)
+    else:
+        breaker_record(key, True)
+    if r.status_code == 200 or (r.status_code == 304 and validators):
+        return r
+    log.warning("FH %s -> %d: %s", path, r.status_code, r.text[:200])
+    return None
+
+
+def fh_get(path, params=None, interactive=False):
+    r = fh_request(path, params, interactive)
+    if r is None:
+        return None
+    try:
+        return r.json()
+    except Exception as e:
+        log.error("FH error: %s", e)
+    return None
+
+
+def fh_get_items(path, params=None, parse=project_from_api, interactive=False, meter=None):
+    """
+    Список з API: data розбирається потоково, і кожен елемент одразу
+    перетворюється через parse (за замовчуванням — у Project).
+    meter — словник, куди додаються bytes і items відповіді.
+    None — якщо запит не вдався.
+    """
+    r = fh_request(path, params, interactive, stream=True)
+    if r is None:
+        return None
+
+    def chunks():
+        for chunk in r.iter_content(chunk_size=65536):
+            if meter is not None:
+                meter["bytes"] += len(chunk)
+            yield chunk
+
+    try:
+        items = [parse(obj) for obj in iter_json_items(chunks())]
+        if meter is not None:
+            meter["items"] += len(items)
+        return items
+    except Exception as e:
+        log.error("FH %s: не вдалося розібрати відповідь: %s", path, e)
+        return None
+    finally:
+        r.close()
+
+
+# ─── Запити ключових слів ─────────────────────────────────────────────────────
+# Кожне ключове слово — вираз: python AND (django OR fastapi) NOT wordpress.
+# Оператори AND / OR / NOT (регістр не важливий), дужки, "фрази в лапках",
+# префікс з зірочкою (react*). Сусідні слова без оператора — AND;
+# «a NOT b» — те саме, що «a AND NOT b». Слова збігаються цілком:
+# java не знаходить javascript, c не знаходить c# чи c++. Складені через
+# крапку (node.js, asp.net) знаходяться і цілими, і за частинами (node).
+#
+# Вираз компілюється один раз у дерево з кортежів:
+#   ("term", слово) ("prefix", початок) ("phrase", (слова...))
+#   ("and", [вузли]) ("or", [вузли]) ("not", вузол)
+
+class QueryError(ValueError):
+    pass
+
+
+def query_tokens(text: str) -> list:
+    return re.findall(r'"[^"]*"|\(|\)|[^\s()"]+', text)
+
+
+# Кеш обмежений: крім ключових слів сюди потрапляє кожен разовий /search
+@lru_cache(maxsize=256)
+def compile_query(text: str):
+    tokens = query_tokens(text)
+    pos    = 0
+
+    def peek():
+        return tokens[pos].upper() if pos < len(tokens) else None
+
+    def parse_or():
+        nonlocal pos
+        nodes = [parse_and()]
+        while peek() == "OR":
+            pos += 1
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and():
+        nonlocal pos
+        nodes = [parse_unary()]
+        while peek() not in (None, "OR", ")"):
+            if peek() == "AND":
+                pos += 1
+            nodes.append(parse_unary())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_unary():
+        nonlocal pos
+        if peek() == "NOT":
+            pos += 1
+            return ("not", parse_unary())
+        return parse_atom()
+
+    def parse_atom():
+        nonlocal pos
+        tok = tokens[pos] if pos < len(tokens) else None
+        if tok is None or tok.upper() in ("AND", "OR", ")"):
+            raise QueryError(f"очікувалось слово, а не «{tok or 'кінець'}»")
+        pos += 1
+        if tok == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise QueryError("не закрита дужка")
+            pos += 1
+            return node
+        if tok.startswith('"'):
+            words = tuple(tokenize(tok.strip('"')))
+            if not words:
+                raise QueryError("порожня фраза")
+            return ("phrase", words) if len(words) > 1 else ("term", words[0])
+        if tok.endswith("*") and tokenize(tok[:-1]) == [tok[:-1].lower()]:
+            return ("prefix", tok[:-1].lower())
+        words = tuple(tokenize(tok))
+        if not words:
+            raise QueryError(f"«{tok}» не містить слів")
+        # c#, .net, node.js — одне слово; «django/flask» — кілька, шукаємо як фразу
+        return ("phrase", words) if len(words) > 1 else ("term", words[0])
+
+    if not tokens:
+        raise QueryError("порожній вираз")
+    tree = parse_or()
+    if pos != len(tokens):
+        raise QueryError(f"зайве «{tokens[pos]}»")
+    return tree
+
+
+def doc_index(project: Project) -> dict:
+    """
+    {слово: [позиції]} для назви й опису — будується один раз на проект.
+    Складене через крапку слово (node.js) індексується ще й частинами
+    на тій самій позиції; c#, c++ і .net — тільки цілими.
+    """
+    if project.index is None:
+        index = defaultdict(list)
+        for i, word in enumerate(tokenize(project.name + " " + project.description)):
+            index[word].append(i)
+            if "." in word[1:] and not word.endswith(("#", "+")):
+                for part in word.lstrip(".").split("."):
+                    if part != word:
+                        index[part].append(i)
+        project.index = dict(index)
+    return project.index
+
+
+def eval_query(node, index: dict) -> bool:
+    kind = node[0]
+    if kind == "term":
+        return node[1] in index
+    if kind == "and":
+        return all(eval_query(n, index) for n in node[1])
+    if kind == "or":
+        return any(eval_query(n, index) for n in node[1])
+    if kind == "not":
+        return not eval_query(node[1], index)
+    if kind == "prefix":
+        return any(word.startswith(node[1]) for word in index)
+    # phrase: слова поспіль
+    first, *rest = node[1]
+    return any(
+        all(p + k + 1 in index.get(word, ()) for k, word in enumerate(rest))
+        for p in index.get(first, ())
+    )
+
+
+def query_terms(node) -> list:
+    """
+    Слова з позитивних (не під NOT) частин виразу — для ранжування й підсвітки.
+    Префікс лишається з зірочкою (react*): tokenize її не породжує, тож
+    плутанини зі словом немає.
+    """
+    kind = node[0]
+    if kind == "term":
+        return [node[1]]
+    if kind == "prefix":
+        return [node[1] + "*"]
+    if kind == "phrase":
+        return list(node[1])
+    if kind == "not":
+        return []
+    return [t for n in node[1] for t in query_terms(n)]
+
+
+def term_positions(term: str, index: dict) -> set:
+    """Позиції слова з query_terms у doc_index — за тими ж правилами, що й eval_query."""
+    if term.endswith("*"):
+        return {p for word, positions in index.items() if word.startswith(term[:-1]) for p in positions}
+    return set(index.get(term, ()))
+
+
+def keyword_error(text: str):
+    """Текст помилки виразу або None, якщо він коректний."""
+    try:
+        compile_query(text)
+    except QueryError as e:
+        return str(e)
     return None
 
 
-def matches_keywords(attr: dict) -> bool:
-    """Перевіряє чи проект містить хоча б одне з ключових слів."""
+def matches_query(project: Project, text: str) -> bool:
+    try:
+        return eval_query(compile_query(text), doc_index(project))
+    except QueryError:
+        return False
+
+
+def matches_keywords(project: Project) -> bool:
+    """Перевіряє чи проект відповідає хоча б одному з виразів ключових слів."""
     if not keywords:
         return True  # Якщо слів немає — пропускаємо всі
-    haystack = (
-        (attr.get("name") or "") + " " + (attr.get("description") or "")
-    ).lower()
-    return any(kw.lower() in haystack for kw in keywords)
+    return any(matches_query(project, kw) for kw in keywords)
 
 
-def get_new_projects():
-    params = {"page[number]": 1, "page[size]": 25}
-    if SKILL_IDS:
-        params["skills"] = SKILL_IDS
-    data = fh_get("/projects", params)
+def keyword_terms() -> set:
+    terms = set()
+    for kw in keywords:
+        try:
+            terms.update(query_terms(compile_query(kw)))
+        except QueryError:
+            pass
+    return terms
+
+
+# ─── Репутація замовників ─────────────────────────────────────────────────────
+
+def employer_filters_active() -> bool:
+    return bool(state["min_rating"] or state["min_reviews"] or state["min_account_days"])
+
+
+def fetch_employer(emp_id):
+    """Профіль замовника з API у стислому вигляді (None — якщо не вдалося)."""
+    data = fh_get(f"/employers/{emp_id}")
     if not data:
-        return []
-    result = []
-    for item in data.get("data", []):
-        pid  = item.get("id")
-        attr = item.get("attributes", {})
-        if not pid or pid in seen_project_ids:
+        return None
+    attr    = (data.get("data") or {}).get("attributes", {})
+    reviews = attr.get("reviews_count")
+    if reviews is None:
+        reviews = (attr.get("positive_reviews") or 0) + (attr.get("negative_reviews") or 0)
+    return {
+        "id":            emp_id,
+        "rating":        float(attr.get("rating") or 0),
+        "reviews":       int(reviews or 0),
+        "registered_at": parse_ts(attr.get("created_at") or attr.get("registered_at")),
+        "fetched_at":    time.time(),
+    }
+
+
+def refresh_employers(items):
+    """
+    Одним пакетом оновлює кеш для замовників з items, яких у кеші немає
+    або чий запис застарів (EMPLOYER_TTL). Свіжі записи — без запитів до API.
+    """
+    now  = time.time()
+    todo = {}
+    with employer_lock:
+        for project in items:
+            login, emp_id = project.employer_login, project.employer_id
+            if not login or not emp_id or login in todo:
+                continue
+            cached = employer_cache.get(login)
+            if cached and now - cached["fetched_at"] < EMPLOYER_TTL:
+                employer_cache_stats["hits"] += 1
+                employer_cache.move_to_end(login)
+            else:
+                employer_cache_stats["misses"] += 1
+                todo[login] = emp_id
+    if not todo:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(EMPLOYER_WORKERS, len(todo)),
+                            thread_name_prefix="employers") as pool:
+        profiles = list(pool.map(fetch_employer, todo.values()))
+
+    with employer_lock:
+        for login, profile in zip(todo, profiles):
+            if not profile:
+                continue
+            employer_cache[login] = profile
+            employer_cache.move_to_end(login)
+            employer_cache_stats["refreshed"] += 1
+        while len(employer_cache) > EMPLOYER_CACHE_MAX:
+            employer_cache.popitem(last=False)
+            employer_cache_stats["evicted"] += 1
+
+
+def passes_employer_filters(login: str) -> bool:
+    """Перевірка репутації з кешу. Якщо профілю немає — не відсіюємо."""
+    profile = employer_cache.get(login)
+    if not profile:
+        return True
+    if profile["rating"] < state["min_rating"]:
+        return False
+    if profile["reviews"] < state["min_reviews"]:
+        return False
+    if state["min_account_days"] and profile["registered_at"]:
+        age_days = (time.time() - profile["registered_at"]) / 86400
+        if age_days < state["min_account_days"]:
+            return False
+    return True
+
+
+def employer_cache_summary() -> str:
+    st    = employer_cache_stats
+    total = st["hits"] + st["misses"]
+    rate  = f"{st['hits'] / total:.0%}" if total else "—"
+    return (f"{len(employer_cache)} записів, влучань {rate} "
+            f"({st['hits']}/{total}), витіснено {st['evicted']}")
+
+
+# ─── Відстеження закладок ─────────────────────────────────────────────────────
+# Збережені проекти перевіряються рідше за стрічку нових (WATCH_INTERVAL) і
+# порціями до WATCH_BATCH за хвилину — найдавніше перевірені першими, тож
+# сотні закладок розтягуються в часі, а не б'ють по квоті одним залпом.
+# Запити умовні (ETag / Last-Modified): незмінений проект — це 304 без тіла.
+
+WATCH_FIELDS = {"status": "Статус", "budget": "Бюджет", "freelancer": "Виконавець"}
+
+
+def watch_fields(item: dict) -> dict:
+    """Поля проекту, зміни яких варті сповіщення."""
+    attr       = item.get("attributes") or {}
+    budget     = attr.get("budget") or {}
+    status     = attr.get("status") or {}
+    freelancer = attr.get("freelancer") or {}
+    return {
+        "status":     status.get("name") or str(status.get("id") or ""),
+        "budget":     f"{budget['amount']} {budget.get('currency') or 'UAH'}" if budget.get("amount") else "договірний",
+        "freelancer": freelancer.get("login") or "",
+    }
+
+
+def fetch_watched(pid: str, validators: dict):
+    """
+    Умовний запит проекту. Повертає (код відповіді, validators, сирий item):
+    код 0 — запит не вдався, 304 — без змін (item None).
+    """
+    r = fh_request(f"/projects/{pid}", validators=validators)
+    if r is None:
+        return 0, validators, None
+    if r.status_code == 304:
+        return 304, validators, None
+    try:
+        item = r.json().get("data") or {}
+    except Exception as e:
+        log.error("FH /projects/%s: %s", pid, e)
+        return 0, validators, None
+    return 200, {"etag": r.headers.get("ETag"), "modified": r.headers.get("Last-Modified")}, item
+
+
+def format_watch_change(pid: str, old: dict, new: dict) -> str:
+    bm    = bookmarks.get(pid) or {}
+    lines = [f"• {label}: {old[f] or '—'} → <b>{new[f] or '—'}</b>"
+             for f, label in WATCH_FIELDS.items() if old[f] != new[f]]
+    return (
+        f"👁 <b>Зміни в збереженому проекті</b>\n\n"
+        f"<a href='{html.escape(bm.get('url', build_project_url({'id': pid})))}'>"
+        f"{html.escape(bm.get('name', f'Проект #{pid}'))}</a>\n\n" + "\n".join(lines)
+    )
+
+
+def check_watched() -> int:
+    """Один прохід: до WATCH_BATCH закладок, яким час перевірки. Повертає кількість змін."""
+    for pid in set(watched) - set(bookmarks):
+        watched.pop(pid)
+    now = time.time()
+    due = sorted(
+        (pid for pid in list(bookmarks)
+         if now - watched.setdefault(pid, {"etag": None, "modified": None, "fields": None,
+                                           "checked_at": 0.0})["checked_at"] >= WATCH_INTERVAL),
+        key=lambda pid: watched[pid]["checked_at"],
+    )[:WATCH_BATCH]
+    if not due or fh_unavailable("/projects/{id}"):
+        return 0
+
+    with ThreadPoolExecutor(max_workers=min(MESSAGE_WORKERS, len(due)),
+                            thread_name_prefix="watch") as pool:
+        results = list(pool.map(
+            lambda pid: fetch_watched(pid, {k: watched[pid][k] for k in ("etag", "modified")}), due))
+
+    changes = 0
+    for pid, (code, validators, item) in zip(due, results):
+        entry = watched.get(pid)
+        if entry is None:
             continue
+        entry.update(validators, checked_at=now)
+        watch_stats["requests"]     += code != 0
+        watch_stats["not_modified"] += code == 304
+        if item is None:
+            continue
+        fields = watch_fields(item)
+        bm     = bookmarks.get(pid)
+        if bm is not None:
+            # Закладка з кнопки зберігається з заглушками — заповнюємо з відповіді
+            attr = item.get("attributes") or {}
+            bm.update(
+                name     = attr.get("name") or bm["name"],
+                url      = build_project_url(item) if item.get("links") else bm["url"],
+                budget   = fields["budget"],
+                employer = (attr.get("employer") or {}).get("login") or bm["employer"],
+            )
+        old, entry["fields"] = entry["fields"], fields
+        if old is None or old == fields:
+            continue
+        if tg_enqueue(f"watch:{pid}:{now:.0f}", format_watch_change(pid, old, fields), lane=LANE_DIRECT):
+            changes += 1
+    watch_stats["changes"] += changes
+    return changes
+
+
+def watch_summary() -> str:
+    ws = watch_stats
+    return (f"{len(watched)} проектів, запитів {ws['requests']} "
+            f"(без змін 304: {ws['not_modified']}), змін {ws['changes']}")
+
+
+# ─── Статистика ───────────────────────────────────────────────────────────────
+
+def stat_add(metric: str, n: int = 1, ts: float = None):
+    if not n:
+        return
+    hour = int((ts or time.time()) // 3600)
+    slot = hour % STATS_SLOTS
+    with stats_lock:
+        if stats_hours[slot] != hour:
+            for counters in stats.values():
+                counters[slot] = 0
+            stats_hours[slot] = hour
+        stats[metric][slot] += n
+
+
+def stat_hourly(metric: str, start_hour: int, end_hour: int) -> list:
+    """Погодинні значення за [start_hour, end_hour), в межах зберігання."""
+    start_hour = max(start_hour, end_hour - STATS_SLOTS)
+    counters   = stats[metric]
+    with stats_lock:
+        return [
+            counters[h % STATS_SLOTS] if stats_hours[h % STATS_SLOTS] == h else 0
+            for h in range(start_hour, end_hour)
+        ]
+
+
+def stat_total(metric: str, start_hour: int, end_hour: int = None) -> int:
+    return sum(stat_hourly(metric, start_hour, end_hour or int(time.time() // 3600) + 1))
+
+
+def trend_str(current: int, previous: int) -> str:
+    if not previous:
+        return "нове" if current else "—"
+    change = (current - previous) / previous
+    return f"{'↑' if change >= 0 else '↓'}{abs(change):.0%}"
+
+
+def digest_entry(project: Project) -> tuple:
+    """Компактний запис для купи дайджесту — без опису і навичок."""
+    budget = f"{project.budget_amount} {project.budget_currency}" if project.budget_amount else "договірний"
+    return (project.score, project.id, project.name, budget, project.url)
+
+
+def digest_push(entries: list):
+    """Додає кандидатів у купу дайджесту."""
+    with digest_lock:
+        heap, ids = digest_top["heap"], digest_top["ids"]
+        for entry in entries:
+            pid = entry[1]
+            if pid in ids:
+                continue
+            if len(heap) < DIGEST_TOP:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                ids.discard(heapq.heapreplace(heap, entry)[1])
+            else:
+                continue
+            ids.add(pid)
+
+
+def digest_take() -> list:
+    """Проекти з останнього дайджесту за спаданням оцінки; купа очищується."""
+    with digest_lock:
+        best = sorted(digest_top["heap"], reverse=True)
+        digest_top.update(heap=[], ids=set())
+        return best
+
+
+def stats_trends() -> str:
+    """Порівняння останніх 7 діб з попередніми 7 і пікові години проектів."""
+    now_h  = int(time.time() // 3600) + 1
+    week_h = now_h - 7 * 24
+    lines  = ["<b>📊 7 днів проти попередніх 7:</b>"]
+    for metric, label in (("projects", "📦 Проекти"), ("messages", "💬 Повідомлення"), ("feed", "🔔 Сповіщення")):
+        cur  = stat_total(metric, week_h, now_h)
+        prev = stat_total(metric, week_h - 7 * 24, week_h)
+        lines.append(f"{label}: {cur} ({trend_str(cur, prev)})")
+
+    # Пікові години — сума проектів за 7 днів по годинах локальної доби
+    by_hour = [0] * 24
+    for h, n in zip(range(week_h, now_h), stat_hourly("projects", week_h, now_h)):
+        by_hour[datetime.fromtimestamp(h * 3600).hour] += n
+    peaks = [h for h in sorted(range(24), key=lambda h: -by_hour[h]) if by_hour[h]][:3]
+    if peaks:
+        lines.append("🕐 Пікові години: " + ", ".join(f"{h:02d}:00 ({by_hour[h]})" for h in peaks))
+    return "\n".join(lines)
+
+
+def delivery_latency_str(start_hour: int) -> str:
+    sent = stat_total("sent", start_hour)
+    return f"{stat_total('send_ms', start_hour) / sent / 1000:.1f} с" if sent else "—"
+
+
+# ─── Дублікати ────────────────────────────────────────────────────────────────
+
+# Слово з «технічними» хвостами: c#, c++, .net, node.js, asp.net цілими токенами;
+# крапка в кінці речення до слова не прилипає
+WORD_PATTERN = re.compile(r"\.?\w+(?:\.\w+)*[#+]*")
+
+
+def tokenize(text: str) -> list:
+    return WORD_PATTERN.findall(text.lower())
+
+
+def simhash(text: str) -> int:
+    """64-бітний SimHash по словах і парах слів."""
+    words    = tokenize(text)
+    features = Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+    weights  = [0] * 64
+    for feature, count in features.items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if h >> bit & 1 else -count
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def project_fingerprint(project: Project) -> int:
+    return simhash(project.name + " " + project.description)
+
+
+def simhash_bands(fp: int):
+    """Ключ відбитка в кожній таблиці — біти відповідної пари блоків."""
+    return [fp & mask for mask in SIMHASH_MASKS]
+
+
+def find_duplicate(fp: int, pid=None):
+    """pid найближчого проекту в межах DUP_DISTANCE (крім самого pid) або None."""
+    with simhash_lock:
+        candidates = set()
+        for band, value in enumerate(simhash_bands(fp)):
+            candidates.update(simhash_buckets[band].get(value, ()))
+        candidates.discard(pid)
+        # Відстань — ще під замком: remember_fingerprint з іншого потоку
+        # (пізній init_projects) може прибрати відбиток одразу після виходу
+        best = min(candidates, key=lambda pid: (simhash_prints[pid] ^ fp).bit_count(), default=None)
+        if best is not None and (simhash_prints[best] ^ fp).bit_count() <= DUP_DISTANCE:
+            return best
+    return None
+
+
+def remember_fingerprint(pid, fp: int):
+    now = time.time()
+    with simhash_lock:
+        # Прибираємо все, що вийшло за вікно зберігання
+        while simhash_order and simhash_order[0][0] < now - DUP_RETENTION:
+            _, old = simhash_order.popleft()
+            old_fp = simhash_prints.pop(old, None)
+            if old_fp is not None:
+                for band, value in enumerate(simhash_bands(old_fp)):
+                    bucket = tuple(p for p in simhash_buckets[band].get(value, ()) if p != old)
+                    if bucket:
+                        simhash_buckets[band][value] = bucket
+                    else:
+                        simhash_buckets[band].pop(value, None)
+        if pid in simhash_prints:
+            return
+        simhash_prints[pid] = fp
+        simhash_order.append((now, pid))
+        for band, value in enumerate(simhash_bands(fp)):
+            simhash_buckets[band][value] = simhash_buckets[band].get(value, ()) + (pid,)
+
+
+# ─── Ранжування ───────────────────────────────────────────────────────────────
+
+# Внесок складових у підсумкову оцінку проекту
+SCORE_WEIGHTS = {"relevance": 0.6, "budget": 0.25, "rating": 0.15}
+SCORE_RATING_CAP = 5000  # рейтинг замовника, з якого складова rating = 1
+
+# Накопичена частота документів для слів з ключових слів: {docs, df}
+term_stats: dict = {"docs": 0, "df": Counter()}
+term_lock = threading.Lock()
+
+
+def project_rating(project: Project) -> float:
+    rating = project.employer_rating
+    if not rating:
+        rating = (employer_cache.get(project.employer_login) or {}).get("rating", 0)
+    try:
+        return max(0.0, float(rating or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def learn_terms(items: list):
+    """
+    Накопичує частоту документів для слів із ключових слів — по всіх нових
+    проектах, а не по одній сторінці. Викликається в основному процесі.
+    """
+    query = keyword_terms()
+    with term_lock:
+        term_stats["docs"] += len(items)
+        if query:
+            for project in items:
+                index = doc_index(project)
+                term_stats["df"].update(t for t in query if term_positions(t, index))
+
+
+def term_idf(terms) -> dict:
+    """IDF слів з накопиченої статистики (для воркера — зі знімка)."""
+    with term_lock:
+        n, df = term_stats["docs"], term_stats["df"]
+        return {t: math.log((1 + n) / (1 + df.get(t, 0))) + 1 for t in terms}
+
+
+def score_projects(items: list) -> list:
+    """
+    Оцінює проекти і повертає [(score, project)] за спаданням. Оцінка абсолютна —
+    не залежить від того, які ще проекти прийшли в цьому циклі чи шарді, тож її
+    можна порівнювати між циклами (MIN_SCORE, дайджест дня). Все в межах 0..1:
+    relevance — частка ключових слів у тексті, зважена IDF з накопиченої
+    статистики, з насиченням за кількістю згадок; budget і rating — логарифмічно
+    відносно фіксованих стель SCORE_BUDGET_CAP і SCORE_RATING_CAP.
+    """
+    if not items:
+        return []
+    query   = keyword_terms()
+    idf     = term_idf(query)
+    q_total = sum(idf.values()) or 1.0
+
+    weights = dict(SCORE_WEIGHTS)
+    if not query:
+        weights["relevance"] = 0.0
+    total_w = sum(weights.values())
+
+    scored = []
+    for project in items:
+        relevance = 0.0
+        if query:
+            # Згадки рахуємо так само, як їх знаходить вираз (react*, node у node.js);
+            # назва йде в doc_index першою і важить удвічі більше за опис
+            index    = doc_index(project)
+            name_len = len(tokenize(project.name))
+            tf = {}
+            for t in query:
+                positions = term_positions(t, index)
+                if positions:
+                    tf[t] = len(positions) + sum(p < name_len for p in positions)
+            relevance = sum(idf[t] * n / (n + 1) for t, n in tf.items()) / q_total
+        amount = math.log1p(max(0.0, float(project.budget_amount or 0))) / math.log1p(SCORE_BUDGET_CAP)
+        rating = math.log1p(project_rating(project)) / math.log1p(SCORE_RATING_CAP)
+        score = (
+            weights["relevance"] * relevance
+            + weights["budget"] * min(1.0, amount)
+            + weights["rating"] * min(1.0, rating)
+        ) / total_w
+        scored.append((round(score, 4), project))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return scored
+
+
+# ─── План запиту /projects ────────────────────────────────────────────────────
+# API вміє фільтрувати /projects лише за навичками (filter[skill_id] або
+# filter[only_my_skills]) — їх і передаємо. Бюджет, чорний список, репутація
+# і ключові слова сервер не підтримує: ці предикати лишаються локальними.
+# Розмір сторінки підлаштовується під потік нових проектів.
+
+projects_page: dict = {"size": 25}
+projects_meter: dict = {"requests": 0, "bytes": 0, "items": 0, "fresh": 0, "delivered": 0}
+
+
+def plan_projects_query(page_size: int, page: int = 1):
+    """(params для API, назви фільтрів, що лишаються локальними)."""
+    params = {"page[number]": page, "page[size]": page_size}
+    if SKILL_IDS.strip().lower() == "my":
+        params["filter[only_my_skills]"] = 1
+    elif SKILL_IDS:
+        params["filter[skill_id]"] = ",".join(s.strip() for s in SKILL_IDS.split(",") if s.strip())
+    local = []
+    if blacklist:
+        local.append("чорний список")
+    if state["min_budget"] > 0:
+        local.append("бюджет")
+    if employer_filters_active():
+        local.append("репутація")
+    if keywords:
+        local.append("ключові слова")
+    return params, local
+
+
+def adapt_page_size(fetched: int, fresh: int):
+    """
+    Розмір першої сторінки на наступний цикл: якщо довелось догортати —
+    збільшуємо; інакше — стискаємо до подвоєного потоку нових із запасом.
+    Пропусків це не спричиняє: fetch_projects догортає сторінки в тому ж циклі.
+    """
+    if fetched and fresh >= fetched:
+        size = fetched * 2
+    else:
+        size = fresh * 2 + 5
+    projects_page["size"] = max(PAGE_MIN, min(PAGE_MAX, size))
+
+
+def plan_summary() -> str:
+    params, local = plan_projects_query(projects_page["size"])
+    server = [f"{k}={v}" for k, v in params.items() if k.startswith("filter")]
+    return (f"API: {', '.join(server) or 'без фільтрів'}; "
+            f"локально: {', '.join(local) or 'нічого'}; сторінка {projects_page['size']}")
+
+
+def meter_summary() -> str:
+    m = projects_meter
+    return (f"{m['requests']} запитів, {m['bytes'] / 1024:.0f} КБ, "
+            f"отримано {m['items']}, нових {m['fresh']}, доставлено {m['delivered']}")
+
+
+def fetch_projects():
+    """
+    Стрічка проектів від найновіших. Поки сторінка повністю нова (жодного
+    баченого id) — догортаємо наступну в тому ж циклі, доки не наберемо
+    PAGE_MAX проектів: інакше сплеск більший за сторінку загубився б.
+    None — якщо перша сторінка не завантажилась.
+    """
+    size     = projects_page["size"]
+    projects = []
+    ids      = set()
+    page     = 1
+    while True:
+        params, _ = plan_projects_query(size, page)
+        items     = fh_get_items("/projects", params, meter=projects_meter)
+        if items is None:
+            return projects or None
+        projects_meter["requests"] += 1
+        # Поки гортали, стрічка могла зсунутись — той самий проект на двох сторінках
+        projects.extend(p for p in items if p.id not in ids)
+        ids.update(p.id for p in items)
+        if (len(items) < size or len(projects) >= PAGE_MAX
+                or any(p.id in seen_project_ids for p in items)):
+            return projects
+        page += 1
+
+
+def get_new_projects():
+    """
+    Етап отримувача: нові проекти з API після фільтрів, що залежать від
+    стану цього процесу (бачені, чорний список, бюджет, репутація, повтори).
+    Ключові слова й ранжування — в select_projects.
+    """
+    fetch_start = time.time()
+    projects    = fetch_projects()
+    fetch_end   = time.time()
+    if not projects:
+        return []
+    fresh = [p for p in projects if p.id and p.id not in seen_project_ids]
+    projects_meter["fresh"] += len(fresh)
+    learn_terms(fresh)
+    adapt_page_size(len(projects), len(fresh))
+    if employer_filters_active():
+        refresh_employers(fresh)
+    result   = []
+    spans    = []
+    rejected = 0
+    for project in fresh:
+        pid = project.id
         seen_project_ids.add(pid)
+        filter_start = time.time()
 
         # Чорний список
-        emp_login = (attr.get("employer") or {}).get("login", "")
+        emp_login = project.employer_login
         if emp_login and emp_login in blacklist:
+            rejected += 1
             continue
 
         # Мінімальний бюджет
         if state["min_budget"] > 0:
-            budget = attr.get("budget") or {}
-            amount = float(budget.get("amount") or 0)
-            if amount < state["min_budget"]:
+            if float(project.budget_amount or 0) < state["min_budget"]:
+                rejected += 1
                 continue
 
-        # Ключові слова
-        if not matches_keywords(attr):
+        # Репутація замовника
+        if emp_login and employer_filters_active() and not passes_employer_filters(emp_login):
+            rejected += 1
             continue
 
-        result.append(item)
+        # Перепублікація вже відомого проекту
+        fp       = project_fingerprint(project)
+        original = find_duplicate(fp, pid)
+        remember_fingerprint(pid, fp)
+        if original is not None:
+            log.info("Проект #%s — повтор #%s", pid, original)
+            if DUP_MODE == "suppress":
+                rejected += 1
+                continue
+            project.duplicate_of = original
+
+        result.append(project)
+        trace_id = f"project:{pid}"
+        spans.append(span(trace_id, "fetch", fetch_start, fetch_end, published_at=project.published_at))
+        spans.append(span(trace_id, "filter", filter_start))
+    trace_write(spans)
+    stat_add("rejected", rejected)
     return result
 
 
+def select_projects(items: list):
+    """
+    Ключові слова та ранжування. Повертає (проекти за спаданням оцінки, скільки відсіяно).
+    Залежить тільки від keywords і кешу рейтингів, тож може виконуватись у воркері.
+    """
+    rank_start = time.time()
+    matched    = [p for p in items if matches_keywords(p)]
+    ranked     = []
+    # Найрелевантніші — першими; нижче порогу MIN_SCORE — відкидаємо
+    for score, project in score_projects(matched):
+        if score < MIN_SCORE:
+            continue
+        project.score = score
+        ranked.append(project)
+    rank_end = time.time()
+    trace_write([span(f"project:{p.id}", "rank", rank_start, rank_end, score=p.score) for p in ranked])
+    return ranked, len(items) - len(ranked)
+
+
 def search_projects(keyword: str):
-    """Разовий пошук за конкретним словом (до 5 результатів)."""
-    params = {"page[number]": 1, "page[size]": 50}
-    if SKILL_IDS:
-        params["skills"] = SKILL_IDS
-    data = fh_get("/projects", params)
-    if not data:
-        return []
-    kw     = keyword.lower()
+    """Разовий пошук за виразом (до 5 результатів). None — API недоступне."""
+    params, _ = plan_projects_query(PAGE_MAX)
+    projects  = fh_get_items("/projects", params, interactive=True)
+    if projects is None:
+        return None
     result = []
-    for item in data.get("data", []):
-        attr     = item.get("attributes", {})
-        haystack = ((attr.get("name") or "") + " " + (attr.get("description") or "")).lower()
-        if kw in haystack:
-            result.append(item)
+    for project in projects:
+        if matches_query(project, keyword.lower()):
+            result.append(project)
         if len(result) >= 5:
             break
     return result
 
 
+def thread_last_at(attr: dict) -> str:
+    """Час останнього повідомлення в треді (з запасними полями)."""
+    return (
+        attr.get("last_message_at") or
+        attr.get("updated_at") or
+        attr.get("created_at") or ""
+    )
+
+
+def fetch_thread_messages(tid: str, since: str):
+    """
+    Повідомлення треду, новіші за курсор since, від старих до нових.
+    None — якщо тред завантажити не вдалося.
+    """
+    data = fh_get(f"/my/threads/{tid}")
+    if not data:
+        return None
+    since_ts = parse_ts(since)
+    result   = []
+    for msg in data.get("data", []):
+        posted = (msg.get("attributes") or {}).get("posted_at")
+        if parse_ts(posted) > since_ts:
+            result.append(msg)
+    result.sort(key=lambda m: parse_ts(m["attributes"].get("posted_at")))
+    return result
+
+
 def get_new_messages():
+    """
+    Повертає [(thread, messages)] для тредів, де з минулого циклу щось змінилось.
+    Завантажуються тільки змінені треди (паралельно, не більше MESSAGE_WORKERS
+    одночасно), і з кожного — тільки повідомлення після курсора.
+    messages = None, якщо тред не вдалося завантажити.
+    """
     data = fh_get("/my/threads")
     if not data:
         return []
-    result = []
+    changed = []
     for thread in data.get("data", []):
-        tid  = str(thread.get("id"))
-        attr = thread.get("attributes", {})
-
-        # Беремо час останнього повідомлення в треді
-        last_at = (
-            attr.get("last_message_at") or
-            attr.get("updated_at") or
-            attr.get("created_at") or ""
-        )
-        # Також враховуємо unread_count як запасний варіант
-        unread = attr.get("unread_count", 0)
+        tid     = str(thread.get("id"))
+        last_at = thread_last_at(thread.get("attributes", {}))
 
         if tid not in thread_last_msg:
             # Перший раз бачимо тред — запам'ятовуємо, не надсилаємо
             thread_last_msg[tid] = last_at
-        else:
-            # Є новий лист якщо: час оновився АБО є непрочитані і час є
-            if last_at and last_at != thread_last_msg[tid]:
-                thread_last_msg[tid] = last_at
-                result.append(thread)
+        elif last_at and last_at != thread_last_msg[tid]:
+            changed.append((thread, thread_last_msg[tid], last_at))
+
+    if not changed:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MESSAGE_WORKERS, len(changed)),
+                            thread_name_prefix="threads") as pool:
+        fetched = list(pool.map(
+            lambda c: fetch_thread_messages(str(c[0].get("id")), c[1]), changed,
+        ))
+
+    result = []
+    for (thread, _, last_at), messages in zip(changed, fetched):
+        thread_last_msg[str(thread.get("id"))] = last_at
+        result.append((thread, messages))
     return result
 
 
@@ -271,64 +1603,86 @@ def get_new_feed():
 
 
 def get_profile():
-    return fh_get("/my/profile")
+    return fh_get("/my/profile", interactive=True)
 
 
 # ─── Форматування ─────────────────────────────────────────────────────────────
 
-def format_project(item):
-    attr  = item.get("attributes", {})
-    pid   = item.get("id", "?")
-
-    name        = attr.get("name", "Без назви")
-    description = (attr.get("description") or "").strip()
-    budget      = attr.get("budget")
-    safe        = attr.get("is_safe", False)
-    skills      = [s.get("name", "") for s in attr.get("skills", [])]
-    employer    = attr.get("employer", {})
-    emp_login   = employer.get("login", "невідомо")
-    emp_rating  = employer.get("rating", 0) or 0
-    emp_reviews = employer.get("reviews_count", 0)
-
-    # ── Правильний URL ──
-    url          = build_project_url(item)
-    employer_url = build_employer_url(emp_login)
-
-    budget_str = "договірний"
-    if budget and budget.get("amount"):
-        budget_str = f"{budget['amount']} {budget.get('currency', 'UAH')}"
-
-    desc_preview = description[:280] + ("..." if len(description) > 280 else "")
-    skills_str   = ", ".join(skills) if skills else "не вказано"
-
-    # Підсвітити знайдені ключові слова у назві (жирним)
-    display_name = name
-    for kw in keywords:
-        idx = display_name.lower().find(kw.lower())
-        if idx != -1:
-            original = display_name[idx:idx+len(kw)]
-            display_name = display_name[:idx] + f"<b>{original}</b>" + display_name[idx+len(kw):]
-            break
+# Шаблон сповіщення про проект; фрагменти замовника й навичок — з кешу
+PROJECT_TEMPLATE = (
+    "🆕 <b>Проект #{pid}</b>\n\n"
+    "📌 {name}\n\n"
+    "{description}\n\n"
+    "💰 Бюджет: <b>{budget}</b>\n"
+    "🛠 Навички: {skills}\n"
+    "{employer}{safe}"
+).format
+
 
+@lru_cache(maxsize=EMPLOYER_CACHE_MAX)
+def employer_fragment(login: str, rating, reviews) -> str:
     try:
-        stars = "⭐" * min(5, round(float(emp_rating) / 20))
+        stars = "⭐" * min(5, round(float(rating) / 20))
     except Exception:
         stars = ""
+    return f"👤 Замовник: {html.escape(login)} {stars} ({reviews} відгуків)"
+
+
+@lru_cache(maxsize=1024)
+def skills_fragment(skills: tuple) -> str:
+    return html.escape(", ".join(skills)) if skills else "не вказано"
+
+
+@lru_cache(maxsize=64)
+def highlight_patterns(terms: tuple) -> list:
+    """Скомпільовані шаблони ключових слів — від найдовшого."""
+    # Межі слова як у tokenize: c не підсвічується в c#, java — в javascript
+    return [re.compile(rf"(?<![\w.]){re.escape(kw[:-1])}\w*" if kw.endswith("*")
+                       else rf"(?<![\w.]){re.escape(kw)}(?![\w#+])", re.IGNORECASE)
+            for kw in sorted(terms, key=len, reverse=True)]
+
+
+def format_project(project: Project, patterns: list = None):
+    """patterns — з highlight_patterns; render_projects передає їх один раз на пачку."""
+    pid       = project.id
+    emp_login = project.employer_login or "невідомо"
+    rating    = project.employer_rating
+    reviews   = project.employer_reviews
+    cached    = employer_cache.get(emp_login)
+    if cached and not rating:
+        rating, reviews = cached["rating"], cached["reviews"]
+
+    description = project.description
+    if len(description) > 280:
+        description = description[:280] + "..."
+
+    # Підсвітити знайдене ключове слово у назві (жирним). Шукаємо в сирій
+    # назві й екрануємо шматки окремо — щоб не влучити всередину &amp;
+    raw  = project.name
+    name = html.escape(raw)
+    if patterns is None:
+        patterns = highlight_patterns(tuple(sorted(keyword_terms())))
+    for pattern in patterns:
+        match = pattern.search(raw)
+        if match:
+            name = (f"{html.escape(raw[:match.start()])}<b>{html.escape(match.group())}</b>"
+                    f"{html.escape(raw[match.end():])}")
+            break
 
-    text = (
-        f"🆕 <b>Проект #{pid}</b>\n\n"
-        f"📌 {display_name}\n\n"
-        f"{desc_preview}\n\n"
-        f"💰 Бюджет: <b>{budget_str}</b>\n"
-        f"🛠 Навички: {skills_str}\n"
-        f"👤 Замовник: {emp_login} {stars} ({emp_reviews} відгуків)"
-        + ("\n✅ Безпечна угода" if safe else "")
+    text = PROJECT_TEMPLATE(
+        pid         = pid,
+        name        = name,
+        description = html.escape(description),
+        budget      = f"{project.budget_amount} {project.budget_currency}" if project.budget_amount else "договірний",
+        skills      = skills_fragment(project.skills),
+        employer    = employer_fragment(emp_login, rating, reviews),
+        safe        = "\n✅ Безпечна угода" if project.safe else "",
     )
-
+    url      = project.url
     keyboard = {"inline_keyboard": [
         [
             {"text": "💼 Відкрити проект",   "url": url},
-            {"text": "👤 Профіль замовника", "url": employer_url},
+            {"text": "👤 Профіль замовника", "url": build_employer_url(emp_login)},
         ],
         [
             {"text": "⭐ Зберегти в закладки",    "callback_data": f"bm_add_{pid}"},
@@ -338,7 +1692,33 @@ def format_project(item):
     return text, keyboard, url  # повертаємо url для збереження в закладки
 
 
-def format_message_thread(thread):
+def render_projects(projects: list) -> list:
+    """Пачкою: [(text, keyboard)] для кожного проекту (повтори — згорнуто)."""
+    patterns = highlight_patterns(tuple(sorted(keyword_terms())))
+    rendered = []
+    for project in projects:
+        if project.duplicate_of:
+            rendered.append(format_duplicate(project))
+        else:
+            rendered.append(format_project(project, patterns)[:2])
+    return rendered
+
+
+def format_duplicate(project: Project):
+    """Згорнуте сповіщення про перепублікацію вже показаного проекту."""
+    text = (
+        f"🔁 <b>Повтор проекту #{project.duplicate_of}</b> → #{project.id}\n"
+        f"📌 {html.escape(project.name)}"
+    )
+    keyboard = {"inline_keyboard": [[{"text": "💼 Відкрити проект", "url": project.url}]]}
+    return text, keyboard
+
+
+def format_message_thread(thread, messages=None):
+    """
+    messages — нові повідомлення треду (див. get_new_messages).
+    Якщо їх немає, показуємо прев'ю last_message зі списку тредів.
+    """
     attr         = thread.get("attributes", {})
     links        = thread.get("links", {})
     subject      = attr.get("subject") or "Нове повідомлення"
@@ -353,10 +1733,23 @@ def format_message_thread(thread):
             sender = login
             break
 
-    # Останнє повідомлення якщо є
-    last_msg     = attr.get("last_message") or {}
-    last_body    = (last_msg.get("body") or last_msg.get("message") or "").strip()
-    last_preview = last_body[:200] + ("..." if len(last_body) > 200 else "")
+    if messages:
+        # Останні 3 нові повідомлення повністю (в межах 300 символів кожне)
+        bodies = []
+        for msg in messages[-3:]:
+            m_attr = msg.get("attributes", {})
+            author = ((m_attr.get("participants") or {}).get("from") or {}).get("login") or sender
+            body   = (m_attr.get("message") or "").strip()
+            body   = body[:300] + ("..." if len(body) > 300 else "")
+            bodies.append(f"<b>{html.escape(author)}:</b> {html.escape(body)}")
+        if len(messages) > 3:
+            bodies.insert(0, f"...ще {len(messages) - 3} раніше")
+        last_preview = "\n\n".join(bodies)
+    else:
+        # Останнє повідомлення якщо є
+        last_msg     = attr.get("last_message") or {}
+        last_body    = (last_msg.get("body") or last_msg.get("message") or "").strip()
+        last_preview = html.escape(last_body[:200] + ("..." if len(last_body) > 200 else ""))
 
     # Правильний URL переписки
     self_link = links.get("self") or {}
@@ -370,12 +1763,14 @@ def format_message_thread(thread):
         url = "https://freelancehunt.com/mailbox/"
 
     unread_str = f"\n📬 Непрочитаних: {unread}" if unread > 0 else ""
+    new_str    = f"\n🆕 Нових: {len(messages)}" if messages else ""
 
     text = (
         f"💬 <b>Нове повідомлення</b>\n\n"
-        f"📧 <b>{subject}</b>\n"
-        f"👤 Від: <b>{sender}</b>"
+        f"📧 <b>{html.escape(subject)}</b>\n"
+        f"👤 Від: <b>{html.escape(sender)}</b>"
         + unread_str
+        + new_str
         + (f"\n\n✉️ {last_preview}" if last_preview else "")
     )
     keyboard = {"inline_keyboard": [[{"text": "📨 Відкрити переписку", "url": url}]]}
@@ -395,32 +1790,262 @@ def format_feed_item(item):
     return text, keyboard
 
 
+# Заголовки сповіщень стрічки за attributes.type; невідомі типи — загальний заголовок
+FEED_LABELS = {
+    "tender_won":         "🏆 Вас обрано виконавцем",
+    "bid_accepted":       "🏆 Вашу ставку прийнято",
+    "bid_rejected":       "🚫 Вашу ставку відхилено",
+    "project_invite":     "📩 Запрошення до проекту",
+    "project_closed":     "📁 Проект закрито",
+    "project_completed":  "✅ Проект завершено",
+    "safe_reserved":      "🔒 Кошти зарезервовано в Сейфі",
+    "safe_paid":          "💰 Оплату з Сейфу отримано",
+    "safe_returned":      "↩️ Кошти з Сейфу повернуто",
+    "arbitrage":          "⚖️ Арбітраж",
+    "review":             "⭐ Новий відгук",
+    "message":            "💬 Нове повідомлення",
+    "contest_winner":     "🏆 Ви перемогли в конкурсі",
+    "contest_invite":     "📩 Запрошення до конкурсу",
+    "payment":            "💳 Рух коштів на рахунку",
+}
+
+
 # ─── Telegram ─────────────────────────────────────────────────────────────────
 
-def tg_send(text, keyboard=None, chat_id=None):
+def tg_payload(text, keyboard=None, chat_id=None) -> dict:
+    payload = {
+        "chat_id": chat_id or TELEGRAM_CHAT_ID,
+        "text": text,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": True,
+    }
+    if keyboard:
+        payload["reply_markup"] = keyboard
+    return payload
+
+
+def tg_deliver(payload: dict):
+    """
+    Надсилає повідомлення, а якщо в payload є message_id — редагує вже надіслане.
+    Повертає (HTTP-статус, message_id); статус 0 — мережева помилка.
+    """
+    method = "editMessageText" if "message_id" in payload else "sendMessage"
     try:
-        payload = {
-            "chat_id": chat_id or TELEGRAM_CHAT_ID,
-            "text": text,
-            "parse_mode": "HTML",
-            "disable_web_page_preview": True,
-        }
-        if keyboard:
-            payload["reply_markup"] = keyboard
         r = requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
+            f"{TG_BASE}/bot{TELEGRAM_BOT_TOKEN}/{method}",
             json=payload, timeout=10,
         )
         if r.status_code != 200:
-            log.warning("TG sendMessage error: %s", r.text[:300])
+            log.warning("TG %s error: %s", method, r.text[:300])
+            return r.status_code, None
+        result = r.json().get("result")
+        return 200, result.get("message_id") if isinstance(result, dict) else payload.get("message_id")
     except Exception as e:
         log.error("TG send error: %s", e)
+        return 0, None
+
+
+def tg_send(text, keyboard=None, chat_id=None) -> bool:
+    """Пряма відправка (відповіді на команди). Сповіщення — через tg_enqueue."""
+    return tg_deliver(tg_payload(text, keyboard, chat_id))[0] == 200
+
+
+# ─── Outbox ───────────────────────────────────────────────────────────────────
+# Сповіщення спершу записуються в SQLite, потім доставляються outbox_loop
+# з повторами. key — ключ ідемпотентності: те саме сповіщення не буде
+# поставлене в чергу вдруге, а після рестарту дошлються тільки pending.
+
+_outbox = {"conn": None, "pid": None}
+outbox_lock = threading.Lock()
+outbox_wake = threading.Event()
+
+# Смуги пріоритету: менше число — раніше. Повідомлення клієнтів і стрічка
+# не чекають за пачкою проектів, дайджести — в останню чергу.
+LANE_DIRECT, LANE_PROJECTS, LANE_DIGEST = 0, 1, 2
+LANE_NAMES = {LANE_DIRECT: "повідомлення", LANE_PROJECTS: "проекти", LANE_DIGEST: "дайджести"}
+
+# streak — скільки доставок поспіль дісталось смузі top, поки нижчі чекали;
+# waits — останні часи очікування в черзі (с) по смугах
+lanes = {"top": None, "streak": 0, "waits": {lane: deque(maxlen=200) for lane in LANE_NAMES}}
+
+
+def outbox_db() -> sqlite3.Connection:
+    # Окреме з'єднання на процес: SQLite-з'єднання не можна ділити між процесами
+    if _outbox["pid"] != os.getpid():
+        conn = sqlite3.connect(OUTBOX_PATH, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"  # pending | sent | failed
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_at REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " sent_at REAL)"
+        )
+        # message_id — id доставленого повідомлення в Telegram, для редагування;
+        # enqueued_at — коли запис востаннє став у чергу (для редагування — час
+        # оновлення, а не першої постановки): від нього рахується очікування
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+        if "lane" not in columns:
+            conn.execute(f"ALTER TABLE outbox ADD COLUMN lane INTEGER NOT NULL DEFAULT {LANE_PROJECTS}")
+        if "message_id" not in columns:
+            conn.execute("ALTER TABLE outbox ADD COLUMN message_id INTEGER")
+        if "enqueued_at" not in columns:
+            conn.execute("ALTER TABLE outbox ADD COLUMN enqueued_at REAL")
+            conn.execute("UPDATE outbox SET enqueued_at = created_at")
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_at)")
+        _outbox.update(conn=conn, pid=os.getpid())
+    return _outbox["conn"]
+
+
+def tg_enqueue(key: str, text, keyboard=None, chat_id=None, lane=LANE_PROJECTS) -> bool:
+    """Ставить сповіщення в outbox. False — якщо з таким key вже було."""
+    now = time.time()
+    with outbox_lock:
+        cur = outbox_db().execute(
+            "INSERT OR IGNORE INTO outbox (key, payload, next_at, created_at, enqueued_at, lane)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, json.dumps(tg_payload(text, keyboard, chat_id), ensure_ascii=False), now, now, now, lane),
+        )
+    outbox_wake.set()
+    return cur.rowcount == 1
+
+
+def tg_revise(key: str, text, keyboard=None, chat_id=None) -> bool:
+    """
+    Оновлює сповіщення key: ще не доставлене — підміняє текст у черзі,
+    доставлене — ставить у чергу редагування того ж повідомлення (кілька
+    оновлень поспіль зливаються в одне). False — оновлювати нічого, треба нове.
+    """
+    with outbox_lock:
+        db  = outbox_db()
+        row = db.execute("SELECT status, message_id FROM outbox WHERE key = ?", (key,)).fetchone()
+        if not row or row[0] == "failed" or (row[0] == "sent" and not row[1]):
+            return False
+        payload = tg_payload(text, keyboard, chat_id)
+        if row[1]:
+            payload["message_id"] = row[1]
+        now = time.time()
+        # Доставлене стає в чергу заново — як нове редагування;
+        # ще не доставлене зберігає свій час у черзі
+        db.execute(
+            "UPDATE outbox SET payload = ?, status = 'pending', attempts = 0, next_at = ?,"
+            " enqueued_at = CASE WHEN status = 'sent' THEN ? ELSE enqueued_at END WHERE key = ?",
+            (json.dumps(payload, ensure_ascii=False), now, now, key),
+        )
+    outbox_wake.set()
+    return True
+
+
+def outbox_pick_lane(due: dict, now: float) -> int:
+    """
+    due — {смуга: час постановки в чергу найстаршого готового запису}.
+    Звичайно береться найвища смуга. Захист від голодування: після LANE_BURST
+    доставок поспіль із вищої смуги одна доставка дістається наступній; а нижча
+    смуга, що чекає довше LANE_MAX_WAIT, отримує кожну другу доставку — але
+    ніколи не забирає чергу у вищої смуги на всі свої записи.
+    """
+    ordered = sorted(due)
+    if len(ordered) == 1 or lanes["top"] != ordered[0]:
+        lanes.update(top=ordered[0], streak=0)
+    if len(ordered) > 1:
+        overdue = [lane for lane in ordered[1:] if now - due[lane] > LANE_MAX_WAIT]
+        if overdue and lanes["streak"] >= 1:
+            lanes["streak"] = 0
+            return min(overdue, key=lambda lane: due[lane])
+        if lanes["streak"] >= LANE_BURST:
+            lanes["streak"] = 0
+            return ordered[1]
+    lanes["streak"] += 1
+    return ordered[0]
+
+
+def outbox_next():
+    now = time.time()
+    with outbox_lock:
+        db  = outbox_db()
+        due = dict(db.execute(
+            "SELECT lane, MIN(enqueued_at) FROM outbox"
+            " WHERE status = 'pending' AND next_at <= ? GROUP BY lane",
+            (now,),
+        ).fetchall())
+        if not due:
+            return None
+        return db.execute(
+            "SELECT key, payload, attempts, created_at, enqueued_at, lane FROM outbox"
+            " WHERE status = 'pending' AND next_at <= ? AND lane = ? ORDER BY enqueued_at LIMIT 1",
+            (now, outbox_pick_lane(due, now)),
+        ).fetchone()
+
+
+def outbox_mark(key: str, status_code: int, attempts: int, created_at: float,
+                payload: str = None, message_id: int = None):
+    now = time.time()
+    with outbox_lock:
+        db = outbox_db()
+        if status_code == 200:
+            if message_id and payload is not None:
+                # Якщо поки ми доставляли, сповіщення оновили (tg_revise) —
+                # лишаємо його в черзі, але вже як редагування доставленого
+                cur = db.execute(
+                    "UPDATE outbox SET status = 'sent', sent_at = ?, message_id = ? WHERE key = ? AND payload = ?",
+                    (now, message_id, key, payload),
+                )
+                if cur.rowcount == 0:
+                    db.execute(
+                        "UPDATE outbox SET message_id = ?, payload = json_set(payload, '$.message_id', ?),"
+                        " enqueued_at = ? WHERE key = ?",
+                        (message_id, message_id, now, key),
+                    )
+            else:
+                db.execute("UPDATE outbox SET status = 'sent', sent_at = ? WHERE key = ?", (now, key))
+            if payload is not None and '"message_id"' in payload:
+                stat_add("edits")
+                return
+            stat_add("sent")
+            stat_add("send_ms", int((now - created_at) * 1000))
+        elif 400 <= status_code < 500 and status_code != 429 or attempts + 1 >= OUTBOX_ATTEMPTS:
+            # Помилка в самому повідомленні або вичерпано спроби — далі не пробуємо
+            log.error("Outbox: %s не доставлено (статус %s, спроб %d)", key, status_code, attempts + 1)
+            db.execute("UPDATE outbox SET status = 'failed', attempts = attempts + 1 WHERE key = ?", (key,))
+        else:
+            delay = min(300, 2 ** attempts) * random.uniform(0.5, 1.0)
+            db.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_at = ? WHERE key = ?",
+                (now + delay, key),
+            )
+
+
+def outbox_prune(days: int = 7):
+    with outbox_lock:
+        outbox_db().execute(
+            "DELETE FROM outbox WHERE status != 'pending' AND created_at < ?",
+            (time.time() - days * 86400,),
+        )
+
+
+def outbox_summary() -> str:
+    with outbox_lock:
+        rows = dict(outbox_db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    return f"в черзі {rows.get('pending', 0)}, не доставлено {rows.get('failed', 0)}"
+
+
+def lane_summary() -> str:
+    """Очікування в черзі по смугах: p50 / max за останні доставки."""
+    parts = []
+    for lane, name in LANE_NAMES.items():
+        waits = list(lanes["waits"][lane])
+        if waits:
+            parts.append(f"{name} p50 {percentile(waits, .5):.1f} с / max {max(waits):.1f} с")
+    return "; ".join(parts) or "ще не було доставок"
 
 
 def tg_answer_callback(cq_id, text=""):
     try:
         requests.post(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/answerCallbackQuery",
+            f"{TG_BASE}/bot{TELEGRAM_BOT_TOKEN}/answerCallbackQuery",
             json={"callback_query_id": cq_id, "text": text}, timeout=5,
         )
     except Exception:
@@ -430,7 +2055,7 @@ def tg_answer_callback(cq_id, text=""):
 def tg_get_updates(offset=0):
     try:
         r = requests.get(
-            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates",
+            f"{TG_BASE}/bot{TELEGRAM_BOT_TOKEN}/getUpdates",
             params={"offset": offset, "timeout": 25,
                     "allowed_updates": ["message", "callback_query"]},
             timeout=30,
@@ -483,6 +2108,11 @@ def send_menu(chat_id=None):
 
 # ─── Обробники ────────────────────────────────────────────────────────────────
 
+def keyword_id(kw: str) -> str:
+    """Короткий стабільний id виразу для callback_data (Telegram дає до 64 байт)."""
+    return hashlib.blake2b(kw.encode(), digest_size=6).hexdigest()
+
+
 def handle_keywords(chat_id):
     if not keywords:
         text = (
@@ -490,17 +2120,20 @@ def handle_keywords(chat_id):
             "Список порожній — бот показує <b>всі</b> проекти.\n\n"
             "Додай слова і бот фільтруватиме тільки ті проекти,\n"
             "де є <b>хоча б одне</b> з них.\n\n"
+            "Можна писати вирази:\n"
+            "<code>python AND (django OR fastapi) NOT wordpress</code>\n"
+            "<code>\"телеграм бот\"</code> — фраза, <code>react*</code> — префікс\n\n"
             "Команди:\n"
             "/addkw python — додати слово\n"
             "/delkw python — видалити слово\n"
             "/clearkw — очистити всі"
         )
     else:
-        kw_list = "\n".join(f"  • {kw}" for kw in keywords)
+        kw_list = "\n".join(f"  • {html.escape(kw)}" for kw in keywords)
         text = (
             f"🔑 <b>Ключові слова ({len(keywords)})</b>\n\n"
             f"{kw_list}\n\n"
-            "Бот показує проекти де є <b>хоча б одне</b> з цих слів.\n\n"
+            "Бот показує проекти, що підходять під <b>хоча б один</b> вираз.\n\n"
             "/addkw слово — додати\n"
             "/delkw слово — видалити\n"
             "/clearkw — очистити всі"
@@ -510,7 +2143,7 @@ def handle_keywords(chat_id):
     btns = [[{"text": "➕ Додати слово", "callback_data": "kw_add_prompt"}]]
     if keywords:
         for kw in keywords:
-            btns.append([{"text": f"🗑 Видалити «{kw}»", "callback_data": f"kw_del_{kw}"}])
+            btns.append([{"text": f"🗑 Видалити «{kw}»", "callback_data": f"kw_del_{keyword_id(kw)}"}])
         btns.append([{"text": "🗑 Очистити всі", "callback_data": "kw_clear"}])
 
     tg_send(text, keyboard={"inline_keyboard": btns}, chat_id=chat_id)
@@ -521,28 +2154,52 @@ def handle_status(chat_id):
     budget_str = f"{state['min_budget']} UAH" if state["min_budget"] > 0 else "без обмеження"
     kw_str     = ", ".join(f'"{k}"' for k in keywords) if keywords else "немає (всі проекти)"
     digest_str = state["digest_time"] or "вимкнено"
+    if not ready.is_set():
+        ready_str = f"⏳ ініціалізація ({time.monotonic() - startup['started_at']:.0f} с)"
+    else:
+        ready_str = f"✅ за {startup['ready_in']:.1f} с"
+        if startup["missing"]:
+            ready_str += f" (без базового стану: {', '.join(startup['missing'])})"
 
     tg_send(
         f"<b>📊 Стан бота</b>\n\n"
         f"Статус: {paused_str}\n"
+        f"Готовність: {ready_str}\n"
         f"Інтервал: кожні {CHECK_INTERVAL // 60} хв\n"
         f"Мін. бюджет: {budget_str}\n"
         f"🔑 Ключові слова: {kw_str}\n"
         f"📅 Дайджест: {digest_str}\n"
         f"⭐ Закладок: {len(bookmarks)}\n"
+        f"👁 Відстеження: {watch_summary()}\n"
         f"🚫 Чорний список: {len(blacklist)} замовників\n"
-        f"📦 Проектів в базі: {len(seen_project_ids)}",
+        f"📦 Проектів в базі: {len(seen_project_ids)}\n"
+        f"🧭 Запит проектів: {plan_summary()}\n"
+        f"📥 Трафік /projects: {meter_summary()}\n"
+        f"👤 Кеш замовників: {employer_cache_summary()}\n"
+        f"🔌 API: {breaker_summary()}\n"
+        f"📉 Квота API: {rate_summary()}\n"
+        f"📤 Outbox: {outbox_summary()}\n"
+        f"🚦 Очікування: {lane_summary()}",
         chat_id=chat_id,
     )
 
 
 def handle_stats(chat_id):
-    d = stats[today()]
+    day_h  = day_start_hour()
+    prev_h = day_start_hour(1)
+
+    def line(metric):
+        return f"{stat_total(metric, day_h)} (вчора {stat_total(metric, prev_h, day_h)})"
+
     tg_send(
         f"<b>📈 Статистика за {today()}</b>\n\n"
-        f"📦 Нових проектів: {d['projects']}\n"
-        f"💬 Нових повідомлень: {d['messages']}\n"
-        f"🔔 Сповіщень: {d['feed']}\n\n"
+        f"📦 Нових проектів: {line('projects')}\n"
+        f"💬 Нових повідомлень: {line('messages')}\n"
+        f"🔔 Сповіщень: {line('feed')}\n"
+        f"🚫 Відсіяно фільтрами: {line('rejected')}\n"
+        f"✏️ Оновлено замість нових: {line('edits')}\n"
+        f"⏱ Сер. затримка доставки: {delivery_latency_str(day_h)}\n\n"
+        f"{stats_trends()}\n\n"
         f"⭐ Закладок всього: {len(bookmarks)}\n"
         f"📊 Проектів в базі: {len(seen_project_ids)}",
         chat_id=chat_id,
@@ -554,12 +2211,22 @@ def handle_filter(chat_id):
     kw_str     = ", ".join(f'"{k}"' for k in keywords) if keywords else "не встановлено (всі проекти)"
     skills_str = SKILL_IDS if SKILL_IDS else "всі"
     bl_str     = ", ".join(sorted(blacklist)) if blacklist else "порожній"
+    emp_parts  = []
+    if state["min_rating"]:
+        emp_parts.append(f"рейтинг від {state['min_rating']}")
+    if state["min_reviews"]:
+        emp_parts.append(f"відгуків від {state['min_reviews']}")
+    if state["min_account_days"]:
+        emp_parts.append(f"акаунт від {state['min_account_days']} дн.")
+    emp_str    = ", ".join(emp_parts) if emp_parts else "не встановлено"
 
     tg_send(
         f"<b>🔍 Поточні фільтри</b>\n\n"
         f"💰 Мін. бюджет: {budget_str}\n"
         f"🔑 Ключові слова: {kw_str}\n"
+        f"🎯 Мін. оцінка релевантності: {MIN_SCORE or 'не встановлено'}\n"
         f"🛠 Навички (ID): {skills_str}\n"
+        f"👤 Замовник: {emp_str}\n"
         f"🚫 Чорний список: {bl_str}",
         chat_id=chat_id,
     )
@@ -576,8 +2243,8 @@ def handle_bookmarks(chat_id):
     tg_send(f"<b>⭐ Збережені проекти ({len(bookmarks)})</b>", chat_id=chat_id)
     for bm in list(bookmarks.values()):
         tg_send(
-            f"⭐ <b>{bm['name']}</b>\n"
-            f"💰 {bm['budget']} · 👤 {bm['employer']}\n"
+            f"⭐ <b>{html.escape(bm['name'])}</b>\n"
+            f"💰 {bm['budget']} · 👤 {html.escape(bm['employer'])}\n"
             f"Збережено: {bm['saved_at']}",
             keyboard={"inline_keyboard": [
                 [
@@ -612,7 +2279,17 @@ def handle_blacklist_cmd(chat_id):
     )
 
 
+def reply_if_unavailable(path: str, chat_id) -> bool:
+    """Швидка відмова, поки breaker ендпоінта відкритий. True — якщо відповіли."""
+    wait_s = fh_unavailable(path)
+    if wait_s:
+        tg_send(f"⚠️ Freelancehunt зараз недоступний. Спробуй через {wait_s} с.", chat_id=chat_id)
+    return bool(wait_s)
+
+
 def handle_profile(chat_id):
+    if reply_if_unavailable("/my/profile", chat_id):
+        return
     data = get_profile()
     if not data:
         tg_send("Не вдалося отримати профіль.", chat_id=chat_id)
@@ -652,11 +2329,15 @@ def handle_help(chat_id):
         "<b>Ключові слова (фільтр):</b>\n"
         "/keywords — список слів\n"
         "/addkw python — додати слово\n"
+        "/addkw python AND (django OR fastapi) NOT wordpress\n"
         "/delkw python — видалити слово\n"
         "/clearkw — очистити всі\n\n"
         "<b>Інші фільтри:</b>\n"
         "/budget 1000 — мін. бюджет\n"
         "/budget 0 — скинути\n"
+        "/rating 50 — мін. рейтинг замовника\n"
+        "/reviews 3 — мін. відгуків замовника\n"
+        "/accountage 30 — мін. вік акаунта (днів)\n"
         "/filter — всі активні фільтри\n\n"
         "<b>Пошук і збереження:</b>\n"
         "/search слово — разовий пошук\n"
@@ -664,7 +2345,9 @@ def handle_help(chat_id):
         "/blacklist — чорний список\n\n"
         "<b>Інше:</b>\n"
         "/digest 09:00 — щоденний дайджест\n"
-        "/profile — акаунт і баланс\n\n"
+        "/profile — акаунт і баланс\n"
+        "/perf check 3 — профілювати наступні цикли\n"
+        "/traces — затримки від публікації до доставки\n\n"
         "<b>Кнопки під проектом:</b>\n"
         "⭐ Зберегти · 🚫 Заблокувати · ⏰ Нагадати",
         chat_id=chat_id,
@@ -672,30 +2355,45 @@ def handle_help(chat_id):
 
 
 def send_daily_digest(chat_id=None):
-    d   = stats[today()]
-    bms = list(bookmarks.values())
+    day_h  = day_start_hour()
+    bms    = list(bookmarks.values())
     kw_str = ", ".join(f'"{k}"' for k in keywords) if keywords else "всі проекти"
 
     text = (
         f"<b>📅 Щоденний дайджест — {today()}</b>\n\n"
-        f"📦 Нових проектів: {d['projects']}\n"
-        f"💬 Повідомлень: {d['messages']}\n"
-        f"🔔 Сповіщень: {d['feed']}\n"
-        f"🔑 Фільтр: {kw_str}\n"
+        f"📦 Нових проектів: {stat_total('projects', day_h)}\n"
+        f"💬 Повідомлень: {stat_total('messages', day_h)}\n"
+        f"🔔 Сповіщень: {stat_total('feed', day_h)}\n"
+        f"🚫 Відсіяно фільтрами: {stat_total('rejected', day_h)}\n"
+        f"🔑 Фільтр: {kw_str}\n\n"
+        f"{stats_trends()}\n"
     )
+    best = digest_take()
+    if best:
+        text += f"\n🏆 Найкращі проекти дня ({len(best)}):\n"
+        for score, pid, name, budget, url in best:
+            text += f"  • <a href='{html.escape(url)}'>{html.escape(name)}</a> — {budget} ({score:.2f})\n"
     if bms:
         text += f"\n⭐ Збережені проекти ({len(bms)}):\n"
         for bm in bms[:3]:
-            text += f"  • <a href='{bm['url']}'>{bm['name']}</a> — {bm['budget']}\n"
+            text += f"  • <a href='{html.escape(bm['url'])}'>{html.escape(bm['name'])}</a> — {bm['budget']}\n"
         if len(bms) > 3:
             text += f"  ...і ще {len(bms) - 3}\n"
 
-    tg_send(text, chat_id=chat_id or TELEGRAM_CHAT_ID)
+    tg_enqueue(f"digest:{today()}", text, chat_id=chat_id or TELEGRAM_CHAT_ID, lane=LANE_DIGEST)
 
 
 def do_search(keyword: str, chat_id: int):
-    tg_send(f'🔎 Шукаю "<b>{keyword}</b>"...', chat_id=chat_id)
+    if error := keyword_error(keyword.lower()):
+        tg_send(f'⚠️ Некоректний вираз: {html.escape(error)}', chat_id=chat_id)
+        return
+    if reply_if_unavailable("/projects", chat_id):
+        return
+    tg_send(f'🔎 Шукаю "<b>{html.escape(keyword)}</b>"...', chat_id=chat_id)
     results = search_projects(keyword)
+    if results is None:
+        tg_send("⚠️ Не вдалося виконати пошук — Freelancehunt не відповідає.", chat_id=chat_id)
+        return
     if not results:
         tg_send("Нічого не знайдено. Спробуй інше слово.", chat_id=chat_id)
         return
@@ -708,11 +2406,44 @@ def do_search(keyword: str, chat_id: int):
 
 # ─── Команди ──────────────────────────────────────────────────────────────────
 
+def defer_until_ready(text: str, chat_id: int) -> bool:
+    """Відкладає команду до готовності бота. True — якщо команду відкладено."""
+    with deferred_lock:
+        if ready.is_set():
+            return False
+        deferred.append((text, chat_id))
+    tg_send("⏳ Бот ще ініціалізується — відповім, щойно буде готовий.", chat_id=chat_id)
+    return True
+
+
+def flush_deferred():
+    with deferred_lock:
+        ready.set()
+        pending = deferred[:]
+        deferred.clear()
+    for text, chat_id in pending:
+        try:
+            handle_command(text, chat_id)
+        except Exception as e:
+            log.error("Deferred command error: %s", e)
+
+
+# Команди фільтрів репутації: команда -> (ключ у state, назва)
+EMPLOYER_FILTER_COMMANDS = {
+    "/rating":     ("min_rating",       "Мін. рейтинг замовника"),
+    "/reviews":    ("min_reviews",      "Мін. відгуків замовника"),
+    "/accountage": ("min_account_days", "Мін. вік акаунта (днів)"),
+}
+
+
 def handle_command(text: str, chat_id: int):
     parts = text.strip().split(None, 1)
     cmd   = parts[0].lower().split("@")[0]
     arg   = parts[1].strip() if len(parts) > 1 else ""
 
+    if cmd in BASELINE_COMMANDS and defer_until_ready(text, chat_id):
+        return
+
     if cmd == "/start":
         state["paused"] = False
         tg_send(
@@ -747,6 +2478,8 @@ def handle_command(text: str, chat_id: int):
             kw = arg.lower().strip()
             if kw in [k.lower() for k in keywords]:
                 tg_send(f'Слово «{kw}» вже є в списку.', chat_id=chat_id)
+            elif error := keyword_error(kw):
+                tg_send(f'⚠️ Некоректний вираз: {html.escape(error)}', chat_id=chat_id)
             else:
                 keywords.append(kw)
                 tg_send(
@@ -804,6 +2537,19 @@ def handle_command(text: str, chat_id: int):
             waiting_for[chat_id] = "budget"
             tg_send("💰 Введи мінімальний бюджет в UAH (0 = скинути):", chat_id=chat_id)
 
+    elif cmd in EMPLOYER_FILTER_COMMANDS:
+        key, label = EMPLOYER_FILTER_COMMANDS[cmd]
+        try:
+            val = max(0, int(float(arg)))
+            state[key] = val
+            tg_send(
+                f"👤 Фільтр «{label}» скинуто." if val == 0
+                else f"✅ {label}: <b>{val}</b>",
+                chat_id=chat_id,
+            )
+        except ValueError:
+            tg_send(f"Введи число. Наприклад: {cmd} 10 (0 = скинути)", chat_id=chat_id)
+
     elif cmd == "/bookmarks":
         handle_bookmarks(chat_id)
 
@@ -816,6 +2562,12 @@ def handle_command(text: str, chat_id: int):
     elif cmd == "/help":
         handle_help(chat_id)
 
+    elif cmd == "/perf":
+        handle_perf(arg, chat_id)
+
+    elif cmd == "/traces":
+        tg_send(f"<b>⏱ Затримки сповіщень</b>\n\n{trace_summary()}", chat_id=chat_id)
+
     elif cmd == "/digest":
         if arg:
             if arg == "0":
@@ -859,7 +2611,9 @@ def handle_callback(data: str, chat_id: int, cq_id):
         answer(); handle_status(chat_id)
 
     elif data == "stats":
-        answer(); handle_stats(chat_id)
+        answer()
+        if not defer_until_ready("/stats", chat_id):
+            handle_stats(chat_id)
 
     elif data == "filter":
         answer(); handle_filter(chat_id)
@@ -905,11 +2659,14 @@ def handle_callback(data: str, chat_id: int, cq_id):
         tg_send("🗑 Всі ключові слова видалено. Показуються всі проекти.", chat_id=chat_id)
 
     elif data.startswith("kw_del_"):
-        kw = data.replace("kw_del_", "", 1)
-        if kw in keywords:
+        kid = data.replace("kw_del_", "", 1)
+        kw  = next((k for k in keywords if keyword_id(k) == kid), None)
+        if kw is None:
+            answer("Вже видалено")
+        else:
             keywords.remove(kw)
-        answer(f"Видалено «{kw}»")
-        tg_send(f'🗑 «{kw}» видалено. Залишилось: {len(keywords)}', chat_id=chat_id)
+            answer(f"Видалено «{kw}»")
+            tg_send(f'🗑 «{html.escape(kw)}» видалено. Залишилось: {len(keywords)}', chat_id=chat_id)
         handle_keywords(chat_id)
 
     elif data.startswith("bm_add_"):
@@ -943,7 +2700,8 @@ def handle_callback(data: str, chat_id: int, cq_id):
             "url":  bm.get("url",  f"https://freelancehunt.com/project/{pid}.html"),
         })
         answer(f"⏰ Нагадаю через {hours} год")
-        tg_send(f"⏰ Нагадаю через {hours} год про «{bm.get('name', f'Проект #{pid}')}»", chat_id=chat_id)
+        tg_send(f"⏰ Нагадаю через {hours} год про «{html.escape(bm.get('name', f'Проект #{pid}'))}»",
+                chat_id=chat_id)
 
     elif data.startswith("bl_add_"):
         login = data.replace("bl_add_", "")
@@ -969,6 +2727,8 @@ def handle_text_input(text: str, chat_id: int):
             return
         if kw in [k.lower() for k in keywords]:
             tg_send(f'Слово «{kw}» вже є.', chat_id=chat_id)
+        elif error := keyword_error(kw):
+            tg_send(f'⚠️ Некоректний вираз: {html.escape(error)}', chat_id=chat_id)
         else:
             keywords.append(kw)
             tg_send(
@@ -1022,7 +2782,7 @@ def polling_loop():
                 if "callback_query" in upd:
                     cq      = upd["callback_query"]
                     chat_id = cq["message"]["chat"]["id"]
-                    handle_callback(cq.get("data", ""), chat_id, cq["id"])
+                    run_profiled("handlers", handle_callback, cq.get("data", ""), chat_id, cq["id"])
                 elif "message" in upd:
                     msg     = upd["message"]
                     chat_id = msg["chat"]["id"]
@@ -1030,30 +2790,70 @@ def polling_loop():
                     if not text:
                         continue
                     if text.startswith("/"):
-                        handle_command(text, chat_id)
+                        run_profiled("handlers", handle_command, text, chat_id)
                     else:
-                        handle_text_input(text, chat_id)
+                        run_profiled("handlers", handle_text_input, text, chat_id)
         except Exception as e:
             log.error("Polling error: %s", e)
         time.sleep(1)
 
 
+def outbox_loop():
+    log.info("Outbox: %s", outbox_summary())
+    last_prune = 0.0
+    while True:
+        try:
+            if time.time() - last_prune > 3600:
+                outbox_prune()
+                last_prune = time.time()
+            row = outbox_next()
+            if not row:
+                outbox_wake.wait(timeout=5)
+                outbox_wake.clear()
+                continue
+            key, payload, attempts, created_at, enqueued_at, lane = row
+            started = time.time()
+            lanes["waits"][lane].append(started - enqueued_at)
+            message = json.loads(payload)
+            status, message_id = tg_deliver(message)
+            # Редагування — окремий етап, щоб не підміняти першу доставку в трасі
+            trace_write([span(key, "edit" if "message_id" in message else "deliver", started,
+                              status=status, attempt=attempts + 1,
+                              queued_ms=round((started - enqueued_at) * 1000, 1))])
+            outbox_mark(key, status, attempts, created_at, payload, message_id)
+        except Exception as e:
+            log.error("Outbox error: %s", e)
+        time.sleep(0.4)
+
+
 def reminder_loop():
     while True:
         now = time.time()
         due = [r for r in reminders if r["remind_at"] <= now]
         for r in due:
             reminders.remove(r)
-            tg_send(
-                f"⏰ <b>Нагадування!</b>\n\n<b>{r['name']}</b>",
+            tg_enqueue(
+                f"remind:{r['pid']}:{r['remind_at']:.0f}",
+                f"⏰ <b>Нагадування!</b>\n\n<b>{html.escape(r['name'])}</b>",
                 keyboard={"inline_keyboard": [[{"text": "💼 Відкрити", "url": r["url"]}]]},
+                lane=LANE_DIRECT,
             )
         time.sleep(30)
 
 
+def watch_loop():
+    while True:
+        if ready.is_set() and not state["paused"] and bookmarks:
+            try:
+                check_watched()
+            except Exception as e:
+                log.error("Відстеження закладок: %s", e)
+        time.sleep(60)
+
+
 def digest_loop():
     while True:
-        if state["digest_time"] and state["digest_sent"] != today():
+        if ready.is_set() and state["digest_time"] and state["digest_sent"] != today():
             if now_hhmm() == state["digest_time"]:
                 send_daily_digest()
                 state["digest_sent"] = today()
@@ -1062,32 +2862,301 @@ def digest_loop():
 
 # ─── Ініціалізація ────────────────────────────────────────────────────────────
 
-def init_seen():
-    log.info("Ініціалізація...")
-    data = fh_get("/projects", {"page[number]": 1, "page[size]": 50})
-    if data:
-        for i in data.get("data", []):
-            if pid := i.get("id"):
-                seen_project_ids.add(pid)
+def init_projects() -> bool:
+    projects = fh_get_items("/projects", plan_projects_query(PAGE_MAX)[0])
+    if projects is None:
+        return False
+    for project in projects:
+        if project.id:
+            seen_project_ids.add(project.id)
+            remember_fingerprint(project.id, project_fingerprint(project))
+    return True
+
+
+def init_threads() -> bool:
     threads = fh_get("/my/threads")
-    if threads:
-        for t in threads.get("data", []):
-            tid  = str(t.get("id", ""))
-            attr = t.get("attributes", {})
-            last_at = (
-                attr.get("last_message_at") or
-                attr.get("updated_at") or
-                attr.get("created_at") or ""
-            )
-            if tid:
-                thread_last_msg[tid] = last_at
+    if not threads:
+        return False
+    for t in threads.get("data", []):
+        tid = str(t.get("id", ""))
+        if tid:
+            thread_last_msg[tid] = thread_last_at(t.get("attributes", {}))
+    return True
+
+
+def init_feed() -> bool:
     feed = fh_get("/my/feed")
-    if feed:
-        for f in feed.get("data", []):
-            if fid := f.get("id"):
-                seen_feed_ids.add(fid)
-    log.info("Готово: %d проектів, %d тредів, %d стрічка",
-             len(seen_project_ids), len(seen_thread_ids), len(seen_feed_ids))
+    if not feed:
+        return False
+    for f in feed.get("data", []):
+        if fid := f.get("id"):
+            seen_feed_ids.add(fid)
+    return True
+
+
+# Базові знімки, без яких перший цикл вважав би все новим
+BASELINES = {"projects": init_projects, "threads": init_threads, "feed": init_feed}
+
+
+def init_seen():
+    """
+    Знімає базовий стан паралельно, з дедлайном STARTUP_DEADLINE.
+    Що не встигло — позначається в startup["missing"] і добирається
+    в check_all. Після цього відкривається гейт готовності.
+    """
+    log.info("Ініціалізація...")
+    startup["started_at"] = time.monotonic()
+    pool    = ThreadPoolExecutor(max_workers=len(BASELINES), thread_name_prefix="init")
+    futures = {pool.submit(fn): name for name, fn in BASELINES.items()}
+    done, _ = wait(futures, timeout=STARTUP_DEADLINE)
+    pool.shutdown(wait=False)
+
+    startup["missing"] = sorted(
+        name for f, name in futures.items()
+        if f not in done or f.exception() or not f.result()
+    )
+    startup["ready_in"] = time.monotonic() - startup["started_at"]
+    flush_deferred()
+
+    log.info("Готово за %.1f с: %d проектів, %d тредів, %d стрічка",
+             startup["ready_in"], len(seen_project_ids), len(thread_last_msg), len(seen_feed_ids))
+    if startup["missing"]:
+        log.warning("Без базового стану: %s — доберемо в наступному циклі",
+                    ", ".join(startup["missing"]))
+
+
+def catch_up_baselines():
+    """Добирає базові знімки, що не встигли до дедлайну старту."""
+    for name in list(startup["missing"]):
+        if BASELINES[name]():
+            startup["missing"].remove(name)
+            log.info("Базовий стан «%s» отримано", name)
+
+
+# ─── Воркери ──────────────────────────────────────────────────────────────────
+# При WORKERS > 0 цей процес лише опитує API (get_new_projects), а фільтрацію
+# за словами, ранжування, форматування і постановку в outbox виконують
+# процеси-воркери — кожен для свого шарду проектів. Бот обслуговує один чат,
+# тож шардуємо за ID проекту: інакше вся робота дісталась би одному воркеру.
+# Саму доставку в Telegram воркери не роблять: усі сповіщення йдуть в один
+# чат, а Telegram обмежує частоту повідомлень на чат — паралельні відправники
+# отримували б лише 429. Тож воркери пишуть у спільний outbox, а надсилає
+# один outbox_loop з його повторами і смугами пріоритету.
+
+worker_pool = None
+
+
+def worker_snapshot(items: list) -> dict:
+    """
+    Стан, потрібний воркеру: ключові слова, статистика слів для ранжування
+    і рейтинги замовників з кешу.
+    """
+    logins = {p.employer_login for p in items}
+    query  = keyword_terms()
+    with term_lock:
+        terms = {"docs": term_stats["docs"], "df": Counter({t: term_stats["df"][t] for t in query})}
+    return {
+        "keywords":  list(keywords),
+        "terms":     terms,
+        "employers": {l: employer_cache[l] for l in logins if l in employer_cache},
+    }
+
+
+def process_shard(items: list, snapshot: dict = None):
+    """
+    Вибір, форматування і постановка в outbox.
+    Повертає (в черзі, відсіяно, кандидати в дайджест).
+    """
+    if snapshot is not None:
+        # Воркер-процес: підставляємо стан основного процесу
+        keywords[:] = snapshot["keywords"]
+        term_stats.update(snapshot["terms"])
+        for login, profile in snapshot["employers"].items():
+            employer_cache[login] = profile
+            employer_cache.move_to_end(login)
+        while len(employer_cache) > EMPLOYER_CACHE_MAX:
+            employer_cache.popitem(last=False)
+    ranked, rejected = select_projects(items)
+    queued = 0
+    spans  = []
+    best   = [digest_entry(p) for p in ranked if not p.duplicate_of]
+    format_start = time.time()
+    rendered     = render_projects(ranked)
+    format_end   = time.time()
+    for project, (text, keyboard) in zip(ranked, rendered):
+        key           = f"project:{project.id}"
+        enqueue_start = time.time()
+        if tg_enqueue(key, text, keyboard, lane=LANE_PROJECTS):
+            queued += 1
+        spans.append(span(key, "format", format_start, format_end, batch=len(ranked)))
+        spans.append(span(key, "enqueue", enqueue_start))
+    trace_write(spans)
+    return queued, rejected, best
+
+
+def process_local(items: list):
+    """
+    process_shard у цьому процесі. Якщо й тут збій (напр. outbox зайнятий),
+    проекти знімаються з баченого — наступний цикл спробує їх знову;
+    уже поставлені в outbox не задвояться завдяки ключу.
+    """
+    try:
+        return process_shard(items)
+    except Exception as e:
+        log.error("Обробка %d проектів не вдалась, повторимо в наступному циклі: %s", len(items), e)
+        seen_project_ids.difference_update(p.id for p in items)
+        return 0, 0, []
+
+
+def deliver_projects(items: list) -> int:
+    """Передає проекти на обробку — у воркери або в цьому ж процесі."""
+    if not items:
+        return 0
+    if worker_pool is None:
+        results = [process_local(items)]
+    else:
+        shards  = [shard for shard in ([p for p in items if int(p.id) % WORKERS == n]
+                                       for n in range(WORKERS)) if shard]
+        futures = [worker_pool.submit(process_shard, shard, worker_snapshot(shard)) for shard in shards]
+        # Спільний дедлайн: завислий воркер не тримає check_all (а з ним і
+        # повідомлення зі стрічкою) довше WORKER_TIMEOUT
+        deadline = time.time() + WORKER_TIMEOUT
+        results, hung = [], False
+        for shard, future in zip(shards, futures):
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.time())))
+            except FutureTimeout:
+                log.warning("Воркер: шард з %d проектів не оброблено за %.0f с — обробляємо тут",
+                            len(shard), WORKER_TIMEOUT)
+                hung = True
+                results.append(process_local(shard))
+            except Exception as e:
+                log.warning("Воркер: шард з %d проектів не оброблено (%s) — обробляємо тут", len(shard), e)
+                results.append(process_local(shard))
+        if hung:
+            restart_workers()
+    queued   = sum(q for q, _, _ in results)
+    rejected = sum(r for _, r, _ in results)
+    outbox_wake.set()
+    digest_push([entry for _, _, entries in results for entry in entries])
+    projects_meter["delivered"] += queued
+    stat_add("projects", queued)
+    stat_add("rejected", rejected)
+    return queued
+
+
+def start_workers():
+    global worker_pool
+    if WORKERS > 0:
+        # spawn, а не fork: на момент старту вже працюють потоки polling/outbox
+        worker_pool = ProcessPoolExecutor(max_workers=WORKERS,
+                                          mp_context=multiprocessing.get_context("spawn"))
+        log.info("Запущено %d воркер-процесів", WORKERS)
+
+
+def restart_workers():
+    """
+    Замінює пул із завислим воркером: інакше наступні шарди стоять у черзі
+    за ним. Старий процес завершиться сам; якщо він таки поставить свій шард
+    у outbox, дублів не буде — ключі ті самі, що й при обробці тут.
+    """
+    global worker_pool
+    old, worker_pool = worker_pool, None
+    old.shutdown(wait=False, cancel_futures=True)
+    start_workers()
+
+
+# ─── Профілювання ─────────────────────────────────────────────────────────────
+# Скільки ще наступних викликів профілювати: "check" — цикли check_all,
+# "handlers" — обробники команд/кнопок. Поки лічильник 0 — лише одна перевірка.
+# active — скільки профільованих викликів виконується зараз (з різних потоків):
+# tracemalloc зупиняється лише коли завершився останній з них.
+
+profiler = {"check": PROFILE_CYCLES, "handlers": 0, "chat_id": None, "active": 0}
+profiler_lock = threading.Lock()
+
+
+def run_profiled(kind: str, fn, *args):
+    if profiler[kind] <= 0:
+        return fn(*args)
+    with profiler_lock:
+        if profiler[kind] <= 0:
+            profiled = False
+        else:
+            profiler[kind]     -= 1
+            profiler["active"] += 1
+            profiled = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+    if not profiled:
+        return fn(*args)
+
+    before  = tracemalloc.take_snapshot()
+    prof    = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        return prof.runcall(fn, *args)
+    finally:
+        elapsed = time.perf_counter() - started
+        after   = tracemalloc.take_snapshot()
+        with profiler_lock:
+            profiler["active"] -= 1
+            if profiler["active"] == 0 and profiler["check"] <= 0 and profiler["handlers"] <= 0:
+                tracemalloc.stop()
+        try:
+            dump_profile(kind, getattr(fn, "__name__", kind), prof, elapsed, before, after)
+        except Exception as e:
+            log.error("Profile dump error: %s", e)
+
+
+def dump_profile(kind, name, prof, elapsed, before, after):
+    """Зберігає .pstats і текстовий підсумок, надсилає підсумок адміну."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{kind}-{name}-{datetime.now():%Y%m%d-%H%M%S-%f}")
+    prof.dump_stats(base + ".pstats")
+
+    out = StringIO()
+    pstats.Stats(prof, stream=out).strip_dirs().sort_stats("cumulative").print_stats(12)
+    top_calls = "\n".join(l for l in out.getvalue().splitlines() if l.strip())
+    top_alloc = "\n".join(
+        f"{stat.size_diff / 1024:+.1f} KiB  {stat.traceback[0]}"
+        for stat in after.compare_to(before, "lineno")[:8]
+    )
+    summary = (f"{name} ({kind}): {elapsed:.3f} с\n\n"
+               f"{top_calls}\n\nТоп алокацій:\n{top_alloc}")
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(summary)
+    log.info("Профіль збережено: %s.pstats (%.3f с)", base, elapsed)
+    tg_send(
+        f"🧪 <b>Профіль {html.escape(name)}</b> — {elapsed:.3f} с\n"
+        f"<pre>{html.escape(summary[:3500])}</pre>\n"
+        f"Файл: {html.escape(base)}.pstats",
+        chat_id=profiler["chat_id"] or TELEGRAM_CHAT_ID,
+    )
+
+
+def handle_perf(arg: str, chat_id):
+    """/perf check 3 | /perf handlers 5 | /perf off — тільки для основного чату."""
+    if str(chat_id) != str(TELEGRAM_CHAT_ID):
+        tg_send("Команда доступна лише адміністратору.", chat_id=chat_id)
+        return
+    parts = arg.split()
+    if parts[:1] == ["off"]:
+        with profiler_lock:
+            profiler.update(check=0, handlers=0)
+        tg_send("🧪 Профілювання вимкнено.", chat_id=chat_id)
+        return
+    try:
+        kind, count = parts[0], int(parts[1]) if len(parts) > 1 else 1
+        if kind not in ("check", "handlers") or count <= 0:
+            raise ValueError
+    except (IndexError, ValueError):
+        tg_send("Формат: /perf check 3, /perf handlers 5 або /perf off", chat_id=chat_id)
+        return
+    with profiler_lock:
+        profiler[kind]      = count
+        profiler["chat_id"] = chat_id
+    tg_send(f"🧪 Профілюю наступні {count} викликів «{kind}». Результат прийде сюди.", chat_id=chat_id)
 
 
 # ─── Main ─────────────────────────────────────────────────────────────────────
@@ -1095,32 +3164,67 @@ def init_seen():
 def check_all():
     if state["paused"]:
         return
+    catch_up_baselines()
+    missing   = startup["missing"]
     new_count = 0
-    for project in get_new_projects():
-        text, keyboard, _ = format_project(project)
-        tg_send(text, keyboard)
-        stats[today()]["projects"] += 1
-        new_count += 1
-        time.sleep(0.4)
-    for thread in get_new_messages():
-        text, kb = format_message_thread(thread)
-        tg_send(text, kb)
-        stats[today()]["messages"] += 1
-        new_count += 1
-        time.sleep(0.4)
-    for feed_item in get_new_feed():
-        text, kb = format_feed_item(feed_item)
-        tg_send(text, kb)
-        stats[today()]["feed"] += 1
-        new_count += 1
-        time.sleep(0.4)
-    log.info("Надіслано %d нових сповіщень" if new_count else "Нічого нового", new_count)
+    if "projects" not in missing:
+        new_count += deliver_projects(get_new_projects())
+    spans = []
+
+    fetch_start = time.time()
+    threads     = get_new_messages() if "threads" not in missing else []
+    fetch_end   = time.time()
+    for tid in [t for t, live in thread_live.items() if fetch_end - live["opened_at"] >= THREAD_COALESCE]:
+        thread_live.pop(tid)
+    for thread, messages in threads:
+        tid  = str(thread.get("id"))
+        live = thread_live.get(tid)
+        if live:
+            # Вікно треду ще відкрите — оновлюємо вже надіслане сповіщення
+            live["messages"] += messages or []
+            text, kb = format_message_thread(thread, live["messages"] or messages)
+            if tg_revise(live["key"], text, kb):
+                stat_add("messages")
+                new_count += 1
+                continue
+        key          = f"thread:{tid}:{thread_last_msg.get(tid, '')}"
+        format_start = time.time()
+        text, kb     = format_message_thread(thread, messages)
+        spans.append(span(key, "fetch", fetch_start, fetch_end,
+                          published_at=parse_ts(thread_last_msg.get(tid))))
+        spans.append(span(key, "format", format_start))
+        if tg_enqueue(key, text, kb, lane=LANE_DIRECT):
+            thread_live[tid] = {"key": key, "opened_at": fetch_end, "messages": list(messages or [])}
+            stat_add("messages")
+            new_count += 1
+
+    fetch_start = time.time()
+    feed_items  = get_new_feed() if "feed" not in missing else []
+    fetch_end   = time.time()
+    for feed_item in feed_items:
+        key          = f"feed:{feed_item.get('id')}"
+        format_start = time.time()
+        text, kb     = format_feed_item(feed_item)
+        spans.append(span(key, "fetch", fetch_start, fetch_end,
+                          published_at=parse_ts((feed_item.get("attributes") or {}).get("created_at"))))
+        spans.append(span(key, "format", format_start))
+        if tg_enqueue(key, text, kb, lane=LANE_DIRECT):
+            stat_add("feed")
+            new_count += 1
+    trace_write(spans)
+    if new_count:
+        log.info("В черзі %d нових сповіщень", new_count)
+    else:
+        log.info("Нічого нового")
 
 
 def run():
     log.info("Бот запущено! Інтервал: %d сек.", CHECK_INTERVAL)
 
-    for target in (polling_loop, reminder_loop, digest_loop):
+    start_workers()
+    init = threading.Thread(target=init_seen, daemon=True)
+    init.start()
+    for target in (polling_loop, outbox_loop, reminder_loop, watch_loop, digest_loop):
         threading.Thread(target=target, daemon=True).start()
 
     tg_send(
@@ -1129,11 +3233,11 @@ def run():
         "Щоб налаштувати фільтр за словами — /keywords"
     )
     send_menu()
-    init_seen()
+    init.join()
 
     while True:
         try:
-            check_all()
+            run_profiled("check", check_all)
         except Exception as e:
             log.error("Помилка: %s", e)
         time.sleep(CHECK_INTERVAL)
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# bot.py пише bot.log у поточну теку під час імпорту — тримаємо його поза репо
+os.chdir(tempfile.mkdtemp(prefix="fh-bot-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
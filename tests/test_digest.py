@@ -0,0 +1,21 @@
+import bot
+
+
+def entry(score: float, pid: str) -> tuple:
+    return (score, pid, f"Проект {pid}", "договірний", f"https://freelancehunt.com/project/{pid}")
+
+
+def test_projects_survive_midnight_until_digest_is_sent(monkeypatch):
+    monkeypatch.setattr(bot, "today", lambda: "2026-10-18")
+    bot.digest_push([entry(0.5, "1"), entry(0.9, "2")])
+    monkeypatch.setattr(bot, "today", lambda: "2026-10-19")
+    bot.digest_push([entry(0.7, "3"), entry(0.9, "2")])
+    assert [e[1] for e in bot.digest_take()] == ["2", "3", "1"]
+    assert bot.digest_take() == []
+
+
+def test_heap_keeps_only_top_entries(monkeypatch):
+    monkeypatch.setattr(bot, "DIGEST_TOP", 2)
+    bot.digest_push([entry(0.1, "a"), entry(0.3, "b"), entry(0.2, "c")])
+    bot.digest_push([entry(0.25, "d")])
+    assert [e[1] for e in bot.digest_take()] == ["b", "d"]
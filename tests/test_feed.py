@@ -0,0 +1,17 @@
+import bot
+
+
+def feed_item(ftype: str) -> dict:
+    return {"id": 1, "attributes": {"type": ftype, "message": "Проект «Бот»"},
+            "links": {"self": {"href": "https://freelancehunt.com/my/feed"}}}
+
+
+def test_known_type_gets_its_label():
+    text, keyboard = bot.format_feed_item(feed_item("tender_won"))
+    assert text.startswith("<b>🏆 Вас обрано виконавцем</b>")
+    assert keyboard["inline_keyboard"][0][0]["url"] == "https://freelancehunt.com/my/feed"
+
+
+def test_unknown_type_falls_back_to_generic_label():
+    text, _ = bot.format_feed_item(feed_item("something_new"))
+    assert text.startswith("<b>🔔 Нове сповіщення</b>")
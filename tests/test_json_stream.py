@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+import bot
+
+DOCUMENTS = [
+    '{"data": []}',
+    '{"data": [1, 2, 3]}',
+    '{"data": [{"id": 1, "budget": {"amount": 1.5, "rate": 4.5e3}}], "total": 1.25}',
+    '{"links": {"next": "x"}, "meta": [1, [2, 3]], "data": [{"a": -0.5}, {"b": 1E-2}], "total": 12}',
+    '{"total": 1.5, "data": [10, 20.25, -3e+2, 0]}',
+    '{"data": [{"name": "Привіт, світ — ✅", "desc": "лапки \\" і \\u0442екст"}]}',
+    '{"data": [true, false, null, "}", "]", ","]}',
+    ' { "data" : [ { "id" : 7 } , { "id" : 8 } ] , "extra" : { "data" : [ 9 ] } } ',
+    '{"data": [{"nested": {"data": [1]}}, 123456789012345678901234567890]}',
+]
+
+
+def chunked(raw: bytes, size: int):
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_every_chunk_size(doc):
+    raw      = doc.encode("utf-8")
+    expected = json.loads(doc)["data"]
+    for size in range(1, len(raw) + 1):
+        assert list(bot.iter_json_items(chunked(raw, size))) == expected, size
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_every_split_point(doc):
+    raw      = doc.encode("utf-8")
+    expected = json.loads(doc)["data"]
+    for cut in range(len(raw) + 1):
+        assert list(bot.iter_json_items([raw[:cut], raw[cut:]])) == expected, cut
+
+
+@pytest.mark.parametrize("doc", ['{"data": [1, 2', '{"data": [{"id": 1}', '{"data": [1.', '[1, 2]'])
+def test_truncated_or_wrong_shape(doc):
+    with pytest.raises(ValueError):
+        list(bot.iter_json_items(chunked(doc.encode(), 3)))
@@ -0,0 +1,12 @@
+import bot
+
+
+def test_thread_subject_sender_and_preview_are_escaped():
+    thread = {"id": 7, "attributes": {
+        "subject": "Q&A <test>", "participants": [{"login": "a<b>"}],
+        "last_message": {"body": "x < y & z"},
+    }}
+    text, _ = bot.format_message_thread(thread)
+    assert "Q&amp;A &lt;test&gt;" in text
+    assert "a&lt;b&gt;" in text
+    assert "x &lt; y &amp; z" in text
@@ -0,0 +1,41 @@
+import pytest
+
+import bot
+
+
+@pytest.fixture(autouse=True)
+def fresh_lanes():
+    bot.lanes.update(top=None, streak=0)
+
+
+def drain(queues: dict, now: float) -> list:
+    """Порядок доставки для {смуга: [час постановки, ...]}."""
+    order = []
+    while any(queues.values()):
+        due  = {lane: items[0] for lane, items in queues.items() if items}
+        lane = bot.outbox_pick_lane(due, now)
+        order.append(lane)
+        queues[lane].pop(0)
+    return order
+
+
+def test_fresh_direct_message_beats_overdue_projects():
+    now   = 10_000.0
+    order = drain({bot.LANE_PROJECTS: [now - 300] * 40, bot.LANE_DIRECT: [now]}, now)
+    assert order[0] == bot.LANE_DIRECT
+
+
+def test_overdue_lower_lane_is_interleaved_not_drained():
+    now   = 10_000.0
+    order = drain({bot.LANE_PROJECTS: [now - 300] * 5, bot.LANE_DIRECT: [now] * 5}, now)
+    assert order[:4] == [bot.LANE_DIRECT, bot.LANE_PROJECTS] * 2
+
+
+def test_burst_guard_gives_lower_lane_a_slot():
+    now   = 10_000.0
+    order = drain({bot.LANE_PROJECTS: [now] * 2, bot.LANE_DIRECT: [now] * (bot.LANE_BURST + 5)}, now)
+    assert order[:bot.LANE_BURST + 1] == [bot.LANE_DIRECT] * bot.LANE_BURST + [bot.LANE_PROJECTS]
+
+
+def test_single_lane_is_served():
+    assert bot.outbox_pick_lane({bot.LANE_DIGEST: 0.0}, 10_000.0) == bot.LANE_DIGEST
@@ -0,0 +1,91 @@
+import pytest
+
+import bot
+
+
+def project(text: str) -> bot.Project:
+    return bot.Project(
+        id="1", name=text, description="", budget_amount=0, budget_currency="UAH",
+        safe=False, skills=(), employer_id=None, employer_login="", employer_rating=0,
+        employer_reviews=0, url="", published_at=0.0,
+    )
+
+
+@pytest.mark.parametrize("text, tree", [
+    ("python",                   ("term", "python")),
+    ("Python AND django",        ("and", [("term", "python"), ("term", "django")])),
+    ("python django",            ("and", [("term", "python"), ("term", "django")])),
+    ("a or b and c",             ("or", [("term", "a"), ("and", [("term", "b"), ("term", "c")])])),
+    ("a NOT b",                  ("and", [("term", "a"), ("not", ("term", "b"))])),
+    ("not (a or b)",             ("not", ("or", [("term", "a"), ("term", "b")]))),
+    ('"телеграм бот"',           ("phrase", ("телеграм", "бот"))),
+    ('"бот"',                    ("term", "бот")),
+    ("react*",                   ("prefix", "react")),
+    ("c#",                       ("term", "c#")),
+    ("C++",                      ("term", "c++")),
+    (".NET",                     ("term", ".net")),
+    ("node.js",                  ("term", "node.js")),
+    ("django/flask",             ("phrase", ("django", "flask"))),
+])
+def test_compile(text, tree):
+    assert bot.compile_query(text) == tree
+
+
+@pytest.mark.parametrize("text", [
+    "", "AND", "a OR", "(a", "a)", '""', "NOT", "a AND AND b", "!!!",
+])
+def test_compile_errors(text):
+    with pytest.raises(bot.QueryError):
+        bot.compile_query(text)
+
+
+@pytest.mark.parametrize("query, text, expected", [
+    ("python",                    "Бот на Python",                        True),
+    ("java",                      "Сайт на JavaScript",                   False),
+    ("javascript",                "Сайт на JavaScript",                   True),
+    ("java*",                     "Сайт на JavaScript",                   True),
+    ("python AND django",         "python, flask",                        False),
+    ("python OR django",          "django only",                          True),
+    ("python NOT wordpress",      "python і wordpress",                   False),
+    ('"телеграм бот"',            "Потрібен телеграм бот",                True),
+    ('"телеграм бот"',            "бот для телеграм",                     False),
+    ("c#",                        "Програма на C#",                       True),
+    ("c#",                        "Програма на C",                        False),
+    ("c#",                        "Проект на C++",                        False),
+    ("c",                         "Програма на C#",                       False),
+    ("c++",                       "Проект на C++ та Qt",                  True),
+    ("c++",                       "Програма на C#",                       False),
+    (".net",                      "Бекенд на .NET 8",                     True),
+    (".net",                      "Мережа net",                           False),
+    ("node.js",                   "API на Node.js.",                      True),
+    ("node",                      "API на Node.js",                       True),
+    ("python",                    "Скрипт на python.",                    True),
+])
+def test_match(query, text, expected):
+    assert bot.matches_query(project(text), query) is expected
+
+
+@pytest.mark.parametrize("query, text, exact", [
+    ("react*", "ReactJS дашборд", "React дашборд"),
+    ("node",   "API на Node.js",  "API на Node"),
+])
+def test_rank_counts_what_the_expression_matched(monkeypatch, query, text, exact):
+    monkeypatch.setattr(bot, "keywords", [query])
+    (matched, _), = bot.score_projects([project(text)])
+    (reference, _), = bot.score_projects([project(exact)])
+    (unmatched, _), = bot.score_projects([project("Лендинг на Tilda")])
+    assert matched == reference > unmatched
+
+
+def test_malformed_search_reports_the_error(monkeypatch):
+    sent = []
+    monkeypatch.setattr(bot, "tg_send", lambda text, *a, **kw: sent.append(text))
+    monkeypatch.setattr(bot, "search_projects", lambda kw: pytest.fail("пошук не мав запускатися"))
+    bot.do_search("(python", 1)
+    assert sent == ["⚠️ Некоректний вираз: не закрита дужка"]
+
+
+def test_compiled_query_cache_is_bounded():
+    for i in range(1000):
+        bot.compile_query(f"разовий{i}")
+    assert bot.compile_query.cache_info().currsize <= bot.compile_query.cache_info().maxsize
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+import bot
+
+
+@pytest.fixture(autouse=True)
+def fresh_budget():
+    bot.rate_budget.update(limit=None, remaining=None, reported=None, reset_at=0.0, tat=0.0, waited=0.0)
+
+
+def respond(remaining: int, limit: int = 1000):
+    bot.update_rate_budget({"X-Ratelimit-Limit": str(limit), "X-Ratelimit-Remaining": str(remaining)}, 200)
+
+
+def test_out_of_order_responses_keep_the_window():
+    respond(900)
+    reset_at = bot.rate_budget["reset_at"] = time.time() + 1800
+    for _ in range(4):
+        bot.rate_acquire(interactive=True)
+    assert bot.rate_budget["remaining"] == 896
+    for remaining in (899, 897, 898, 896):
+        respond(remaining)
+    assert bot.rate_budget["reset_at"] == reset_at
+    assert bot.rate_budget["reported"] == 896
+
+
+def test_jump_back_to_limit_starts_a_new_window():
+    respond(900)
+    bot.rate_budget["reset_at"] = time.time() + 1800
+    respond(998)
+    assert bot.rate_budget["reset_at"] > time.time() + bot.RATE_WINDOW - 5
+    assert bot.rate_budget["reported"] == 998
+
+
+def test_reset_header_is_used_as_is():
+    bot.update_rate_budget({"X-Ratelimit-Limit": "1000", "X-Ratelimit-Remaining": "900",
+                            "X-Ratelimit-Reset": "60"}, 200)
+    assert 55 < bot.rate_budget["reset_at"] - time.time() <= 60
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+import bot
+
+
+@pytest.fixture(autouse=True)
+def clean_index():
+    yield
+    with bot.simhash_lock:
+        for table in bot.simhash_buckets:
+            table.clear()
+        bot.simhash_prints.clear()
+        bot.simhash_order.clear()
+
+
+def flip(fp: int, bits) -> int:
+    for bit in bits:
+        fp ^= 1 << bit
+    return fp
+
+
+def test_every_distance_within_limit_is_found():
+    rng = random.Random(5)
+    prints = [rng.getrandbits(64) for _ in range(500)]
+    for i, fp in enumerate(prints):
+        bot.remember_fingerprint(str(i), fp)
+    for _ in range(2000):
+        i = rng.randrange(len(prints))
+        distance = rng.randint(0, bot.DUP_DISTANCE)
+        assert bot.find_duplicate(flip(prints[i], rng.sample(range(64), distance))) == str(i)
+
+
+def test_beyond_limit_and_own_pid_are_ignored():
+    bot.remember_fingerprint("1", 0)
+    assert bot.find_duplicate(flip(0, range(bot.DUP_DISTANCE + 1))) is None
+    assert bot.find_duplicate(0, "1") is None
+    assert bot.find_duplicate(0) == "1"
+
+
+def test_expired_prints_leave_no_buckets(monkeypatch):
+    bot.remember_fingerprint("1", 12345)
+    monkeypatch.setattr(bot, "DUP_RETENTION", -1)
+    bot.remember_fingerprint("2", 67890)
+    assert list(bot.simhash_prints) == ["2"]
+    assert all(len(table) == 1 for table in bot.simhash_buckets)
+    assert bot.find_duplicate(12345) is None
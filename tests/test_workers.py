@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import Future
+
+import bot
+
+
+class HungPool:
+    """Пул, чий воркер ніколи не відповідає."""
+
+    def __init__(self):
+        self.shut = False
+
+    def submit(self, fn, *args):
+        return Future()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut = True
+
+
+def test_hung_worker_falls_back_and_replaces_the_pool(monkeypatch):
+    pool, local = HungPool(), []
+    monkeypatch.setattr(bot, "worker_pool", pool)
+    monkeypatch.setattr(bot, "WORKERS", 2)
+    monkeypatch.setattr(bot, "WORKER_TIMEOUT", 0.2)
+    monkeypatch.setattr(bot, "start_workers", lambda: None)
+    monkeypatch.setattr(bot, "stat_add", lambda *a: None)
+    monkeypatch.setattr(bot, "process_local", lambda items: local.append(len(items)) or (len(items), 0, []))
+    items = [bot.Project(id=str(i), name="", description="", budget_amount=0, budget_currency="UAH",
+                         safe=False, skills=(), employer_id=None, employer_login="", employer_rating=0,
+                         employer_reviews=0, url="", published_at=0.0) for i in range(4)]
+    started = time.time()
+    assert bot.deliver_projects(items) == 4
+    assert time.time() - started < 1
+    assert local == [2, 2]
+    assert pool.shut and bot.worker_pool is None